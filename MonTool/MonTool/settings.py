@@ -95,6 +95,20 @@ DATABASES = {
     }
 }
 
+# Shared by every web process, so sessions, django_ratelimit counters and
+# cached fragments are the same whichever worker serves a request.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv("CACHE_URL", 'redis://redis:6379/2'),
+        'KEY_PREFIX': 'montool',
+        'TIMEOUT': 300,
+    }
+}
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+RATELIMIT_USE_CACHE = 'default'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -117,7 +131,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -157,6 +171,59 @@ CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_BROKER_HEARTBEAT = 0
 CELERY_RESULT_BACKEND=None
 CELERY_IGNORE_RESULT = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+PING_TIMEOUT = float(os.getenv("PING_TIMEOUT", 4))
+PING_CONCURRENCY = int(os.getenv("PING_CONCURRENCY", 256))
+PING_DOWN_THRESHOLD = int(os.getenv("PING_DOWN_THRESHOLD", 3))
+PING_UP_THRESHOLD = int(os.getenv("PING_UP_THRESHOLD", 2))
+OWNER_CACHE_TTL = int(os.getenv("OWNER_CACHE_TTL", 300))
+CREDENTIAL_CACHE_TTL = int(os.getenv("CREDENTIAL_CACHE_TTL", 600))
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", 25))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", 1))
+
+MONITORING_INTERVAL = int(os.getenv("MONITORING_INTERVAL", 30))
+MONITORING_LEASE_TTL = int(os.getenv("MONITORING_LEASE_TTL", 90))
+COLLECTOR_CONCURRENCY = int(os.getenv("COLLECTOR_CONCURRENCY", 100))
+HISTORY_STEP = int(os.getenv("HISTORY_STEP", MONITORING_INTERVAL))
+HISTORY_RETENTION = int(os.getenv("HISTORY_RETENTION", 24 * 3600))
+HISTORY_BLOCK = int(os.getenv("HISTORY_BLOCK", 3600))
+HISTORY_ARCHIVE_RETENTION = int(os.getenv("HISTORY_ARCHIVE_RETENTION", 30 * 24 * 3600))
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 200))
+STATS_FLUSH_BATCH = int(os.getenv("STATS_FLUSH_BATCH", 200))
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", 1))
+
+# Transports kept per process; size it to the fleet one process collects.
+SSH_POOL_SIZE = int(os.getenv("SSH_POOL_SIZE", max(512, COLLECTOR_CONCURRENCY)))
+SSH_IDLE_TIMEOUT = int(os.getenv("SSH_IDLE_TIMEOUT", 300))
+SSH_KEEPALIVE = int(os.getenv("SSH_KEEPALIVE", 15))
+SSH_CONNECT_TIMEOUT = float(os.getenv("SSH_CONNECT_TIMEOUT", 5))
+SSH_BANNER_TIMEOUT = float(os.getenv("SSH_BANNER_TIMEOUT", 10))
+SSH_AUTH_TIMEOUT = float(os.getenv("SSH_AUTH_TIMEOUT", 10))
+SSH_BREAKER_BASE = float(os.getenv("SSH_BREAKER_BASE", 30))
+SSH_BREAKER_MAX = float(os.getenv("SSH_BREAKER_MAX", 1800))
+
+METRICS_FLUSH_BATCH = int(os.getenv("METRICS_FLUSH_BATCH", 5000))
+METRICS_RAW_RETENTION = int(os.getenv("METRICS_RAW_RETENTION", 14))
+METRICS_PARTITIONS_AHEAD = int(os.getenv("METRICS_PARTITIONS_AHEAD", 2))
+# Days each rollup resolution is kept; every resolution is rebuilt from the
+# recent part of the finer one, so 1m must outlive 2 hours and 1h 2 days.
+METRICS_ROLLUP_RETENTION = {
+    "1m": int(os.getenv("METRICS_1M_RETENTION", 7)),
+    "1h": int(os.getenv("METRICS_1H_RETENTION", 180)),
+    "1d": int(os.getenv("METRICS_1D_RETENTION", 730)),
+}
+
+SSE_STREAM_TTL = int(os.getenv("SSE_STREAM_TTL", 300))
+SSE_KEEPALIVE = int(os.getenv("SSE_KEEPALIVE", 15))
+MY_SERVERS_CACHE_TTL = int(os.getenv("MY_SERVERS_CACHE_TTL", 300))
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 60))
+TOKEN_EXPIRY = int(os.getenv("TOKEN_EXPIRY", 0))
+
+AGENT_STALE_AFTER = int(os.getenv("AGENT_STALE_AFTER", 3 * MONITORING_INTERVAL))
+AGENT_MAX_SKEW = int(os.getenv("AGENT_MAX_SKEW", 300))
+AGENT_MAX_BATCH = int(os.getenv("AGENT_MAX_BATCH", 4 * 1024 * 1024))
 
 LOGGING = {
     'version': 1,
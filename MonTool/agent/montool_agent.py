@@ -0,0 +1,208 @@
+"""
+MonTool push agent.
+
+A single-file, standard-library-only agent for Linux hosts that samples
+/proc locally and pushes gzip-compressed batches to the MonTool ingestion
+endpoint, so the host does not need to accept SSH connections from the
+MonTool workers.
+
+Usage:
+    MONTOOL_URL=https://montool.example.com MONTOOL_AGENT_TOKEN=<token> \\
+        python3 montool_agent.py [--interval 30] [--batch 2]
+
+The token is issued per server with POST /api/api_agent_token/<server id>/.
+"""
+import argparse
+import gzip
+import logging
+import math
+import os
+import struct
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+
+MAGIC = b"MTA1"
+
+METRICS = ("free_memory", "available_memory", "total_memory", "free_disk", "disk_used_pct_max", "cpu_load",
+           "cpu_pct", "net_rx_bps", "net_tx_bps", "disk_read_bps", "disk_write_bps")
+
+PSEUDO_FILESYSTEMS = {"tmpfs", "devtmpfs", "overlay", "squashfs", "proc", "sysfs", "cgroup", "cgroup2",
+                      "devpts", "mqueue", "debugfs", "tracefs", "securityfs", "pstore", "efivarfs", "autofs"}
+
+SECTOR = 512
+
+logger = logging.getLogger("montool_agent")
+
+
+def read_counters():
+    """
+    Read the cumulative CPU, network and disk counters.
+    """
+    with open("/proc/stat") as file:
+        values = [int(value) for value in file.readline().split()[1:9]]
+    cpu = (sum(values), values[3] + values[4])
+
+    rx = tx = 0
+    with open("/proc/net/dev") as file:
+        for line in file.readlines()[2:]:
+            interface, fields = line.split(":", 1)
+            if interface.strip() != "lo":
+                fields = fields.split()
+                rx += int(fields[0])
+                tx += int(fields[8])
+
+    read = written = 0
+    for name in os.listdir("/sys/block"):
+        if name.startswith(("loop", "ram", "dm-", "zram")):
+            continue
+        try:
+            with open(f"/sys/block/{name}/stat") as file:
+                fields = file.read().split()
+        except OSError:
+            continue
+        read += int(fields[2])
+        written += int(fields[6])
+    return time.monotonic(), cpu, (rx, tx), (read * SECTOR, written * SECTOR)
+
+
+def read_gauges():
+    """
+    Read memory, disk usage and load average.
+    """
+    meminfo = {}
+    with open("/proc/meminfo") as file:
+        for line in file:
+            name, value = line.split(":", 1)
+            meminfo[name] = int(value.split()[0])
+
+    used_pct = []
+    with open("/proc/mounts") as file:
+        for line in file:
+            device, mount, filesystem = line.split()[:3]
+            if filesystem in PSEUDO_FILESYSTEMS:
+                continue
+            try:
+                stat = os.statvfs(mount)
+            except OSError:
+                continue
+            if stat.f_blocks:
+                used_pct.append(100 * (stat.f_blocks - stat.f_bavail) / stat.f_blocks)
+    root = os.statvfs("/")
+
+    with open("/proc/loadavg") as file:
+        load = float(file.read().split()[0])
+
+    return {
+        "free_memory": meminfo.get("MemFree", 0) // 1024,
+        "available_memory": meminfo.get("MemAvailable", 0) // 1024,
+        "total_memory": meminfo.get("MemTotal", 0) // 1024,
+        "free_disk": root.f_bavail * root.f_frsize / 1024 ** 3,
+        "disk_used_pct_max": max(used_pct, default=0.0),
+        "cpu_load": load,
+    }
+
+
+def rates(previous, current):
+    """
+    Derive CPU usage and I/O rates from two counter snapshots.
+    """
+    if previous is None:
+        return {}
+    elapsed = current[0] - previous[0]
+    if elapsed <= 0:
+        return {}
+    delta_total = current[1][0] - previous[1][0]
+    delta_idle = current[1][1] - previous[1][1]
+    return {
+        "cpu_pct": 100 * (1 - delta_idle / delta_total) if delta_total > 0 else 0.0,
+        "net_rx_bps": max(0, current[2][0] - previous[2][0]) / elapsed,
+        "net_tx_bps": max(0, current[2][1] - previous[2][1]) / elapsed,
+        "disk_read_bps": max(0, current[3][0] - previous[3][0]) / elapsed,
+        "disk_write_bps": max(0, current[3][1] - previous[3][1]) / elapsed,
+    }
+
+
+def encode(samples) -> bytes:
+    """
+    Pack (timestamp, values) samples into a compressed agent batch.
+    """
+    header = bytearray(MAGIC)
+    header.append(len(METRICS))
+    for name in METRICS:
+        header.append(len(name))
+        header += name.encode("ascii")
+    record = struct.Struct(f"<I{len(METRICS)}f")
+    body = bytearray(header)
+    for ts, values in samples:
+        body += record.pack(int(ts), *(float(values.get(name, math.nan)) for name in METRICS))
+    return gzip.compress(bytes(body))
+
+
+def push(url: str, token: str, samples, timeout: float) -> None:
+    """
+    Send one batch; raises on any failure so the samples are kept.
+    """
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/api/api_ingest/",
+        data=encode(samples),
+        method="POST",
+        headers={"Authorization": f"Agent {token}", "Content-Type": "application/octet-stream"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+def run(url: str, token: str, interval: float, batch: int, backlog: int, timeout: float) -> None:
+    """
+    Sample every `interval` seconds and push every `batch` samples, keeping
+    up to `backlog` unsent samples while the server is unreachable.
+    """
+    pending = deque(maxlen=backlog)
+    previous = None
+    next_sample = time.monotonic()
+    while True:
+        try:
+            current = read_counters()
+            pending.append((time.time(), {**read_gauges(), **rates(previous, current)}))
+            previous = current
+        except Exception as error:
+            logger.error(f"Error during sampling - {error}")
+        if len(pending) >= batch:
+            samples = list(pending)
+            try:
+                push(url, token, samples, timeout)
+                for _ in samples:
+                    pending.popleft()
+            except urllib.error.HTTPError as error:
+                logger.error(f"Batch is rejected - {error.code} {error.reason}")
+                if 400 <= error.code < 500 and error.code not in (408, 429):
+                    pending.clear()
+            except Exception as error:
+                logger.error(f"Error during push, {len(pending)} samples are kept - {error}")
+        next_sample += interval
+        time.sleep(max(0.0, next_sample - time.monotonic()))
+
+
+def main() -> None:
+    """
+    Parse the options and run the agent.
+    """
+    parser = argparse.ArgumentParser(description="MonTool push agent")
+    parser.add_argument("--url", default=os.getenv("MONTOOL_URL"))
+    parser.add_argument("--token", default=os.getenv("MONTOOL_AGENT_TOKEN"))
+    parser.add_argument("--interval", type=float, default=float(os.getenv("MONTOOL_INTERVAL", 30)))
+    parser.add_argument("--batch", type=int, default=int(os.getenv("MONTOOL_BATCH", 2)))
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("MONTOOL_BACKLOG", 2880)))
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+    if not args.url or not args.token:
+        parser.error("--url and --token (or MONTOOL_URL and MONTOOL_AGENT_TOKEN) are required")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logger.info("MonTool agent is running...")
+    run(args.url, args.token, args.interval, args.batch, args.backlog, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from app.models import Server
+
+TOKEN_CACHE_KEY = "auth_token:{}"
+
+
+def hash_agent_token(token: str) -> str:
+    """
+    Return the digest an agent token is stored as.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_cache_key(key: str) -> str:
+    """
+    Return the cache key of an API token, named by its digest so the cache
+    never holds usable tokens in its key space.
+    """
+    return TOKEN_CACHE_KEY.format(hash_agent_token(key))
+
+
+def is_expired(token) -> bool:
+    """
+    Tell whether an API token is older than TOKEN_EXPIRY; 0 disables expiry.
+    """
+    expiry = settings.TOKEN_EXPIRY
+    return bool(expiry) and (timezone.now() - token.created).total_seconds() > expiry
+
+
+def without_password(user):
+    """
+    Return a copy of a user with its password hash deferred, safe to keep in
+    the shared cache; saving it leaves the stored password untouched.
+    """
+    fields = [field.attname for field in user._meta.concrete_fields if field.attname != "password"]
+    return type(user).from_db(user._state.db, fields, [getattr(user, field) for field in fields])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps the user of a token, without its password
+    hash, in the shared cache for TOKEN_CACHE_TTL seconds, so most requests
+    make no auth queries. The entries are dropped when a token is deleted or
+    its user is changed.
+    """
+
+    def authenticate_credentials(self, key):
+        """
+        Resolves the token from the cache, falling back to the database.
+        """
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            user = without_password(user)
+            cache.set(cache_key, (user, token.created), settings.TOKEN_CACHE_TTL)
+        else:
+            user, created = cached
+            if not user.is_active:
+                raise AuthenticationFailed("User inactive or deleted.")
+            token = self.get_model()(key=key, user=user, created=created)
+        if is_expired(token):
+            raise AuthenticationFailed("Token has expired.")
+        return user, token
+
+
+class AgentTokenAuthentication(BaseAuthentication):
+    """
+    Per-server agent authentication with the 'Authorization: Agent <token>'
+    header. The request user is the server owner and request.auth is the
+    server the token was issued for.
+    """
+    keyword = "Agent"
+
+    def authenticate(self, request):
+        """
+        Resolves the server of the presented agent token.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed("Invalid agent token header.")
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed("Invalid agent token header.")
+        server = Server.objects.select_related("owner").filter(agent_token=hash_agent_token(token)).first()
+        if server is None or not server.owner.is_active:
+            raise AuthenticationFailed("Invalid agent token.")
+        return server.owner, server
+
+    def authenticate_header(self, request):
+        """
+        Returns the WWW-Authenticate challenge of unauthenticated requests.
+        """
+        return self.keyword
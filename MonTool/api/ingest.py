@@ -0,0 +1,80 @@
+import math
+import struct
+import zlib
+
+from django.conf import settings
+
+from celery_tasks.history import METRICS
+from celery_tasks.stats_writer import write_samples
+
+# Agent batch wire format (gzip-compressed, little endian):
+#   b"MTA1" magic, u8 metric count N, N x (u8 length, ASCII metric name),
+#   then fixed-size records of u32 unix timestamp and N float32 values,
+#   NaN meaning "not sampled".
+MAGIC = b"MTA1"
+
+AGENT_METRICS = frozenset(METRICS) | {"available_memory", "total_memory", "disk_used_pct_max"}
+
+
+def agent_key(server_id) -> str:
+    """
+    Return the Redis key marking a server as reporting through its agent.
+    """
+    return f"agent:{server_id}"
+
+
+def decompress(body: bytes, max_size: int) -> bytes:
+    """
+    Inflate a gzip batch, refusing ones that inflate beyond `max_size`.
+    """
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = inflater.decompress(body, max_size)
+    if inflater.unconsumed_tail:
+        raise ValueError("Batch is too large")
+    return data
+
+
+def decode(data: bytes):
+    """
+    Parse a batch into its metric names and (timestamp, values) records.
+    Records are unpacked straight from a memoryview of the payload, without
+    copying it.
+    """
+    view = memoryview(data)
+    if view[:4] != MAGIC or len(view) < 5:
+        raise ValueError("Not a MonTool agent batch")
+    names, offset = [], 5
+    for _ in range(view[4]):
+        if offset >= len(view) or offset + 1 + view[offset] > len(view):
+            raise ValueError("Truncated metric names")
+        length = view[offset]
+        names.append(bytes(view[offset + 1:offset + 1 + length]).decode("ascii"))
+        offset += 1 + length
+    record = struct.Struct(f"<I{len(names)}f")
+    body = view[offset:]
+    if len(body) % record.size:
+        raise ValueError("Truncated batch")
+    return names, record.iter_unpack(body)
+
+
+def store(r, rb, history, server_id, names, records, now: float) -> int:
+    """
+    Write decoded agent samples through the shared stats write path and mark
+    the server as reporting through its agent. Samples from too far in the
+    future or older than the history span are skipped, so a delayed batch
+    never overwrites newer ring buffer slots. Returns the number of samples
+    stored.
+    """
+    columns = [(index, name) for index, name in enumerate(names) if name in AGENT_METRICS]
+    oldest = now - history.step * history.capacity
+    samples = []
+    for ts, *values in records:
+        if ts > now + settings.AGENT_MAX_SKEW or ts <= oldest:
+            continue
+        samples.append((ts, {name: round(values[index], 2) for index, name in columns if not math.isnan(values[index])}))
+    if not samples:
+        return 0
+
+    r.set(agent_key(server_id), samples[-1][0], ex=settings.AGENT_STALE_AFTER)
+    write_samples(rb, history, [(server_id, ts, values) for ts, values in samples])
+    return len(samples)
@@ -1,10 +1,18 @@
 from django.urls import path
 
-from api.views import Signup, Login, AddServer, ListServers
+from api.views import Signup, Login, Logout, AddServer, ListServers, MonitoringLease, ServerHistory, \
+    AgentToken, AgentIngest, QueueStats, Fleet
 
 urlpatterns = [
     path('api_signup/', Signup.as_view(), name="api_signup"),
     path("api_login/", Login.as_view(), name="api_login"),
+    path("api_logout/", Logout.as_view(), name="api_logout"),
     path("api_addserver/", AddServer.as_view(), name="api_addserver"),
-    path("api_listservers/", ListServers.as_view(), name="api_listservers")
+    path("api_listservers/", ListServers.as_view(), name="api_listservers"),
+    path("api_monitoring/<int:server_id>/", MonitoringLease.as_view(), name="api_monitoring"),
+    path("api_history/<int:server_id>/", ServerHistory.as_view(), name="api_history"),
+    path("api_agent_token/<int:server_id>/", AgentToken.as_view(), name="api_agent_token"),
+    path("api_ingest/", AgentIngest.as_view(), name="api_ingest"),
+    path("api_queues/", QueueStats.as_view(), name="api_queues"),
+    path("api_fleet/", Fleet.as_view(), name="api_fleet"),
 ]
@@ -1,16 +1,38 @@
+import secrets
+import time
+import zlib
+from datetime import datetime, timezone
+
+from celery.result import AsyncResult
+from django.conf import settings
+from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.generics import CreateAPIView, ListAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api import ingest
+from api.authentication import AgentTokenAuthentication, hash_agent_token, is_expired
 from api.serializers import SignupSerializer, LoginSerializer, AddServerSerializer, ListServersSerializer
+from app.fleet import SORTS, fleet_page
 from app.models import Server
+from celery_tasks.connections import r, rb
+from celery_tasks.history import History, METRICS
+from celery_tasks.leases import acquire, release, new_lease_id
+from celery_tasks.queue_stats import queue_stats, broker_client
+from celery_tasks.warehouse import ROLLUPS, series
 import logging
 
 logger = logging.getLogger("api")
 
 
+history = History.from_settings(settings)
+
+broker = broker_client(settings.CELERY_BROKER_URL)
+
+
 class AuthMixin(CreateAPIView):
     """
     Mixin to handle user authentication and token creation.
@@ -19,10 +41,13 @@ class AuthMixin(CreateAPIView):
 
     def perform_create(self, serializer):
         """
-        Saves the user and generates an auth token.
+        Saves the user and generates an auth token, replacing an expired one.
         """
         user = serializer.save()
         token, _ = Token.objects.get_or_create(user=user)
+        if is_expired(token):
+            token.delete()
+            token = Token.objects.create(user=user)
         self.token = token
 
     def create(self, request, *args, **kwargs):
@@ -51,6 +76,21 @@ class Login(AuthMixin):
     logger.info("User is logged in")
 
 
+class Logout(APIView):
+    """
+    API view to revoke the token the request is authenticated with.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Deletes the token; the next login issues a new one.
+        """
+        request.auth.delete()
+        logger.info("User is logged out")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class AddServer(CreateAPIView):
     """
     API view to add a new server.
@@ -80,3 +120,164 @@ class ListServers(ListAPIView):
         """
         logger.info("Servers are listed")
         return Server.objects.filter(owner=self.request.user)
+
+
+class MonitoringLease(APIView):
+    """
+    API view to share the stats collector of a server.
+    POST takes or renews a lease, DELETE releases it; the collector runs
+    while at least one lease is alive.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, server_id):
+        """
+        Takes a new lease, or renews the one passed as 'lease_id'.
+        """
+        get_object_or_404(Server, id=server_id, owner=request.user)
+        lease_id = request.data.get("lease_id") or new_lease_id()
+        viewers = acquire(r, server_id, lease_id, settings.MONITORING_LEASE_TTL)
+        logger.info(f"Monitoring lease of server(id: {server_id}) is renewed")
+        return Response(data={"lease_id": lease_id, "ttl": settings.MONITORING_LEASE_TTL, "viewers": viewers})
+
+    def delete(self, request, server_id):
+        """
+        Releases the lease passed as 'lease_id'.
+        """
+        get_object_or_404(Server, id=server_id, owner=request.user)
+        collector = release(r, server_id, request.data.get("lease_id", ""))
+        if collector:
+            AsyncResult(collector).revoke()
+            logger.info(f"Monitoring of server(id: {server_id}) is stopped")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ServerHistory(APIView):
+    """
+    API view to read the recent history of a server metric.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, server_id):
+        """
+        Returns [timestamp, value] samples of 'metric' between 'start' and
+        'end' (unix seconds, the last hour by default). With 'resolution'
+        (1m, 1h or 1d) it returns [timestamp, avg, min, max] rollup rows
+        from Postgres instead.
+        """
+        get_object_or_404(Server, id=server_id, owner=request.user)
+        metric = request.query_params.get("metric", "cpu_load")
+        if metric not in METRICS:
+            return Response(data={"metric": f"Must be one of {', '.join(METRICS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            end = float(request.query_params.get("end", time.time()))
+            start = float(request.query_params.get("start", end - 3600))
+        except ValueError:
+            return Response(data={"detail": "'start' and 'end' must be unix timestamps"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        resolution = request.query_params.get("resolution")
+        if resolution is not None:
+            if resolution not in ROLLUPS:
+                return Response(data={"resolution": f"Must be one of {', '.join(ROLLUPS)}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            rows = series(server_id, metric, resolution,
+                          datetime.fromtimestamp(start, timezone.utc), datetime.fromtimestamp(end, timezone.utc))
+            logger.info(f"{resolution} rollups of server(id: {server_id}) are read")
+            return Response(data={"metric": metric, "resolution": resolution,
+                                  "samples": [[bucket.timestamp(), *values] for bucket, *values in rows]})
+        samples = history.range(rb, server_id, metric, start, end)
+        logger.info(f"History of server(id: {server_id}) is read")
+        return Response(data={"metric": metric, "step": history.step, "samples": samples})
+
+
+class AgentToken(APIView):
+    """
+    API view to manage the push agent token of a server.
+    POST issues a new token (revoking the previous one), DELETE revokes it.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, server_id):
+        """
+        Returns a new agent token; only its digest is stored, so it is shown once.
+        """
+        server = get_object_or_404(Server, id=server_id, owner=request.user)
+        token = secrets.token_urlsafe(32)
+        server.agent_token = hash_agent_token(token)
+        server.save(update_fields=["agent_token"])
+        logger.info(f"Agent token of server(id: {server_id}) is issued")
+        return Response(data={"token": token}, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, server_id):
+        """
+        Revokes the agent token, returning the server to SSH polling.
+        """
+        server = get_object_or_404(Server, id=server_id, owner=request.user)
+        server.agent_token = None
+        server.save(update_fields=["agent_token"])
+        r.delete(ingest.agent_key(server_id))
+        logger.info(f"Agent token of server(id: {server_id}) is revoked")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AgentIngest(APIView):
+    """
+    API view receiving the gzip-compressed sample batches of push agents.
+    Servers reporting here are skipped by SSH polling.
+    """
+    authentication_classes = [AgentTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Stores a batch of the server the agent token belongs to.
+        """
+        server = request.auth
+        if len(request.body) > settings.AGENT_MAX_BATCH:
+            return Response(data={"detail": "Batch is too large"}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            names, records = ingest.decode(ingest.decompress(request.body, settings.AGENT_MAX_BATCH))
+            stored = ingest.store(r, rb, history, server.id, names, records, time.time())
+        except (ValueError, EOFError, zlib.error) as error:
+            logger.error(f"Invalid agent batch of server(id: {server.id}) - {error}")
+            return Response(data={"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info(f"{stored} agent samples of server(id: {server.id}) are stored")
+        return Response(data={"stored": stored}, status=status.HTTP_202_ACCEPTED)
+
+
+class QueueStats(APIView):
+    """
+    API view exposing the depth and queue latency of every Celery queue.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        Returns the stats of the probe, collect and metrics queues.
+        """
+        from celery_tasks.celery import QUEUES
+        return Response(data=queue_stats(r, broker, QUEUES))
+
+
+class Fleet(APIView):
+    """
+    API view listing the status and latest metrics of all the user's servers.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Returns a page of servers sorted by 'sort' (worst or name) after the
+        'after' cursor, with the cursor of the next page.
+        """
+        sort = request.query_params.get("sort", "worst")
+        if sort not in SORTS:
+            return Response(data={"sort": f"Must be one of {', '.join(SORTS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get("limit", 100)), 1), 500)
+            rows, next_cursor = fleet_page(r, request.user, sort, request.query_params.get("after"), limit)
+        except ValueError as error:
+            return Response(data={"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info("Fleet is listed")
+        return Response(data={"results": rows, "next": next_cursor})
@@ -0,0 +1,53 @@
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django_ratelimit.exceptions import Ratelimited
+
+from celery_tasks.connections import ar
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def async_login_required(view):
+    """
+    `login_required` for async views. The user is resolved off the event
+    loop, so the view and its template can use `request.user` afterwards
+    without touching the database.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_ratelimit(rate: str):
+    """
+    Per-IP fixed-window rate limit for async views, counted in Redis. Like
+    django_ratelimit's `block=True` it raises Ratelimited once exceeded.
+    """
+    limit, period = rate.split("/")
+    limit, period = int(limit), PERIODS[period]
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            window = int(time.time()) // period
+            key = f"ratelimit:{view.__name__}:{request.META.get('REMOTE_ADDR')}:{window}"
+            pipe = ar.pipeline(transaction=False)
+            pipe.incr(key)
+            pipe.expire(key, period)
+            count, _ = await pipe.execute()
+            if count > limit:
+                raise Ratelimited()
+            return await view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,145 @@
+import base64
+import json
+
+from django.db.models import Q
+
+from app.models import Server
+from celery_tasks.status_machine import OFFLINE
+
+FIELDS = ("cpu_pct", "cpu_load", "free_memory", "available_memory", "total_memory", "free_disk",
+          "disk_used_pct_max")
+
+SORTS = ("worst", "name")
+
+# Offline servers sort above any metric, servers without stats below them.
+OFFLINE_SCORE = 1000.0
+
+
+def number(value):
+    """
+    Parse a cached stat, returning None when it is missing or not a number.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize(row, values):
+    """
+    Build one fleet row from a (id, name, ip, os, status) record and its
+    cached HMGET values, scored by its worst resource usage in percent.
+    """
+    stats = dict(zip(FIELDS, values))
+    os_name = row[3]
+    cpu = number(stats["cpu_pct"]) if os_name == "Linux" else number(stats["cpu_load"])
+    total = number(stats["total_memory"])
+    available = number(stats["available_memory"])
+    if available is None:
+        available = number(stats["free_memory"])
+    memory = round(100 * (1 - available / total), 1) if total and available is not None else None
+    disk = number(stats["disk_used_pct_max"])
+
+    usage = {"cpu": cpu, "memory": memory, "disk": disk}
+    worst_metric, score = max(((name, value) for name, value in usage.items() if value is not None),
+                              key=lambda item: item[1], default=(None, -1.0))
+    if row[4] == OFFLINE:
+        worst_metric, score = "status", OFFLINE_SCORE
+    return {
+        "id": row[0], "server_name": row[1], "server_ip": row[2], "os_name": os_name, "status": row[4],
+        "cpu_pct": None if cpu is None else round(cpu, 1), "memory_used_pct": memory,
+        "disk_used_pct": None if disk is None else round(disk, 1),
+        "free_disk": number(stats["free_disk"]), "cpu_load": number(stats["cpu_load"]),
+        "worst_metric": worst_metric, "score": round(score, 1),
+    }
+
+
+def encode_cursor(sort: str, value, last_id) -> str:
+    """
+    Encode the sort and the sort key of the last row of a page as an opaque
+    cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps([sort, value, last_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: str):
+    """
+    Decode a cursor made by `encode_cursor` for the given sort into its
+    (value, id) key; raises ValueError when it is invalid or made for
+    another sort.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as error:
+        raise ValueError(f"Invalid cursor - {error}")
+    value_type = str if sort == "name" else (int, float)
+    if (not isinstance(key, list) or len(key) != 3 or key[0] != sort
+            or not isinstance(key[1], value_type) or isinstance(key[1], bool)
+            or not isinstance(key[2], int) or isinstance(key[2], bool)):
+        raise ValueError(f"Invalid cursor for sort '{sort}'")
+    return key[1], key[2]
+
+
+def queue_reads(pipe, records) -> None:
+    """
+    Queue the HMGET of the cached stats of every record on a pipeline.
+    """
+    for record in records:
+        pipe.hmget(f"server:{record[0]}", FIELDS)
+
+
+def page_query(owner, sort: str, after: str, limit: int):
+    """
+    Build the query of the rows a page is made from.
+
+    Sorting by name pages in SQL on (server_name, id). Sorting by the worst
+    metric needs the cached stats of every server, so it reads all rows and
+    pages in memory on (score, id).
+    """
+    servers = Server.objects.filter(owner=owner)
+    columns = ("id", "server_name", "server_ip", "os_name", "status")
+    if sort != "name":
+        return servers.values_list(*columns)
+    if after:
+        name, last_id = decode_cursor(after, sort)
+        servers = servers.filter(Q(server_name__gt=name) | Q(server_name=name, id__gt=last_id))
+    return servers.order_by("server_name", "id").values_list(*columns)[:limit + 1]
+
+
+def build_page(sort: str, after: str, limit: int, records, values):
+    """
+    Summarize the queried records with their cached stats and cut the page,
+    returning its rows and the cursor of the next page.
+    """
+    rows = [summarize(record, record_values) for record, record_values in zip(records, values)]
+    if sort == "name":
+        page = rows[:limit]
+        return page, encode_cursor(sort, page[-1]["server_name"], page[-1]["id"]) if len(rows) > limit else None
+
+    rows.sort(key=lambda row: (-row["score"], row["id"]))
+    if after:
+        score, last_id = decode_cursor(after, sort)
+        rows = [row for row in rows if (-row["score"], row["id"]) > (-score, last_id)]
+    page = rows[:limit]
+    return page, encode_cursor(sort, page[-1]["score"], page[-1]["id"]) if len(rows) > limit else None
+
+
+def fleet_page(r, owner, sort: str = "worst", after: str = None, limit: int = 100):
+    """
+    Return one page of the owner's fleet and the cursor of the next page,
+    reading the rows in one query and their stats in one pipeline.
+    """
+    records = list(page_query(owner, sort, after, limit))
+    pipe = r.pipeline(transaction=False)
+    queue_reads(pipe, records)
+    return build_page(sort, after, limit, records, pipe.execute())
+
+
+async def afleet_page(ar, owner, sort: str = "worst", after: str = None, limit: int = 100):
+    """
+    Async variant of `fleet_page` for an asyncio Redis client.
+    """
+    records = [record async for record in page_query(owner, sort, after, limit)]
+    pipe = ar.pipeline(transaction=False)
+    queue_reads(pipe, records)
+    return build_page(sort, after, limit, records, await pipe.execute())
@@ -0,0 +1,28 @@
+import time
+
+from django.core.cache import cache
+
+SERVERS_VERSION_KEY = "servers_version:{}"
+
+
+def servers_fragment_key(owner_id, version) -> str:
+    """
+    Return the cache key of an owner's rendered server list at a version.
+    """
+    return f"my_servers:{owner_id}:{version}"
+
+
+def bump_servers_version(owner_ids) -> None:
+    """
+    Move the owners' server list to a new version, so the fragments cached
+    under the old one are never read again and simply expire.
+    """
+    version = time.time_ns()
+    cache.set_many({SERVERS_VERSION_KEY.format(owner_id): version for owner_id in owner_ids}, None)
+
+
+async def aservers_version(owner_id) -> int:
+    """
+    Return the current version of an owner's server list.
+    """
+    return await cache.aget(SERVERS_VERSION_KEY.format(owner_id), 0)
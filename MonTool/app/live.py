@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+from celery_tasks.stats_writer import stats_channel
+
+logger = logging.getLogger("django_web")
+
+
+class StatsHub:
+    """
+    Per-process fan-out of the server stats published by the collectors.
+
+    The process holds a single Redis pub/sub connection subscribed to the
+    channels of the servers someone is watching; every message is copied
+    into the queue of each viewer of that server, so one publish reaches
+    every open dashboard served by the process.
+    """
+
+    def __init__(self, r, queue_size: int = 10):
+        self.r = r
+        self.queue_size = queue_size
+        self.viewers = defaultdict(set)
+        self.pubsub = None
+        self.reader = None
+        self.lock = asyncio.Lock()
+
+    async def subscribe(self, server_id) -> asyncio.Queue:
+        """
+        Register a viewer of a server and return the queue its updates go to.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        async with self.lock:
+            if self.pubsub is None:
+                self.pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+            if not self.viewers[server_id]:
+                await self.pubsub.subscribe(stats_channel(server_id))
+            self.viewers[server_id].add(queue)
+            if self.reader is None or self.reader.done():
+                self.reader = asyncio.create_task(self.read())
+        return queue
+
+    async def unsubscribe(self, server_id, queue: asyncio.Queue) -> None:
+        """
+        Drop a viewer, leaving the server's channel once nobody watches it.
+        """
+        async with self.lock:
+            self.viewers[server_id].discard(queue)
+            if not self.viewers[server_id]:
+                del self.viewers[server_id]
+                await self.pubsub.unsubscribe(stats_channel(server_id))
+
+    async def read(self) -> None:
+        """
+        Copy every published message to the viewers of its server, dropping
+        the oldest queued update of viewers that fall behind.
+        """
+        while True:
+            try:
+                message = await self.pubsub.get_message(timeout=1.0)
+            except Exception as error:
+                logger.error(f"Live-Stats: {error}")
+                await asyncio.sleep(1)
+                continue
+            if not message or message["type"] != "message":
+                continue
+            server_id = int(message["channel"].split(":")[1])
+            for queue in list(self.viewers.get(server_id, ())):
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(message["data"])
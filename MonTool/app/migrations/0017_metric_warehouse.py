@@ -0,0 +1,58 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+CREATE_METRIC_SAMPLE = """
+CREATE TABLE app_metricsample (
+    id bigserial,
+    server_id bigint NOT NULL,
+    metric varchar(32) NOT NULL,
+    ts timestamp with time zone NOT NULL,
+    value double precision NOT NULL
+) PARTITION BY RANGE (ts);
+CREATE INDEX app_metricsample_ts_brin ON app_metricsample USING brin (ts);
+CREATE TABLE app_metricsample_default PARTITION OF app_metricsample DEFAULT;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_remove_server_cpu_load_remove_server_free_disk_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_METRIC_SAMPLE, reverse_sql="DROP TABLE app_metricsample;"),
+        migrations.CreateModel(
+            name='MetricSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=32)),
+                ('ts', models.DateTimeField()),
+                ('value', models.FloatField()),
+            ],
+            options={
+                'db_table': 'app_metricsample',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=32)),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField()),
+                ('sum', models.FloatField()),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('server', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='app.server')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='metricrollup',
+            constraint=models.UniqueConstraint(fields=('server', 'metric', 'resolution', 'bucket'), name='unique_metric_rollup'),
+        ),
+    ]
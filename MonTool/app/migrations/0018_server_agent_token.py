@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_metric_warehouse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='server',
+            name='agent_token',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
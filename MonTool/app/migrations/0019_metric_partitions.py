@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_partitions(apps, schema_editor):
+    """
+    Create the sample partitions of today and the coming days, so samples
+    don't pile up in the default partition before the first partition run.
+    """
+    from celery_tasks.warehouse import ensure_partitions
+
+    ensure_partitions(settings.METRICS_PARTITIONS_AHEAD, settings.METRICS_RAW_RETENTION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_server_agent_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_partitions, migrations.RunPython.noop),
+    ]
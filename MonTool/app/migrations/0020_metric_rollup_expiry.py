@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_metric_partitions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='metricrollup',
+            index=models.Index(fields=['resolution', 'bucket'], name='metric_rollup_expiry'),
+        ),
+    ]
@@ -43,6 +43,7 @@ class Server(models.Model):
     status = models.CharField(max_length=120, default="online", null=True, blank=True)
     owner = models.ForeignKey(MonUser, on_delete=models.DO_NOTHING, related_name="servers")
     created_at = models.DateTimeField(auto_now_add=True, null=True)
+    agent_token = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
     def __str__(self):
         """
@@ -67,3 +68,62 @@ class Profile(models.Model):
         Returns the first name of the profile owner.
         """
         return self.first_name
+
+
+class MetricSample(models.Model):
+    """
+    Raw metric sample of a server.
+
+    The table is created by a migration as a daily range-partitioned table
+    with a BRIN index on `ts`, so it is not managed by Django.
+    """
+    server = models.ForeignKey(Server, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    metric = models.CharField(max_length=32)
+    ts = models.DateTimeField()
+    value = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "app_metricsample"
+
+    def __str__(self):
+        """
+        Returns the metric name and sample time as string representation.
+        """
+        return f"{self.metric}@{self.ts}"
+
+
+class MetricRollup(models.Model):
+    """
+    Aggregate of a server metric over a 1-minute, 1-hour or 1-day bucket.
+    """
+    RESOLUTIONS = [("1m", "1 minute"), ("1h", "1 hour"), ("1d", "1 day")]
+
+    server = models.ForeignKey(Server, on_delete=models.CASCADE, related_name="rollups")
+    metric = models.CharField(max_length=32)
+    resolution = models.CharField(max_length=2, choices=RESOLUTIONS)
+    bucket = models.DateTimeField()
+    count = models.IntegerField()
+    sum = models.FloatField()
+    min = models.FloatField()
+    max = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["server", "metric", "resolution", "bucket"], name="unique_metric_rollup"),
+        ]
+        # Serves the retention deletes, which scan one resolution by bucket.
+        indexes = [models.Index(fields=["resolution", "bucket"], name="metric_rollup_expiry")]
+
+    @property
+    def avg(self) -> float:
+        """
+        Returns the mean value over the bucket.
+        """
+        return self.sum / self.count if self.count else 0.0
+
+    def __str__(self):
+        """
+        Returns the metric name, resolution and bucket as string representation.
+        """
+        return f"{self.metric}/{self.resolution}@{self.bucket}"
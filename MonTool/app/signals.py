@@ -0,0 +1,78 @@
+import logging
+
+import redis
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache_key
+from app.fragments import bump_servers_version
+from app.models import MonUser, Server
+from celery_tasks.connections import r
+from celery_tasks.local_cache import invalidate
+
+logger = logging.getLogger("django_web")
+
+
+@receiver(post_save, sender=MonUser)
+def invalidate_owners(sender, instance, **kwargs) -> None:
+    """
+    Drop the owner -> Telegram id cache of the Celery workers on user save,
+    except for the last_login update of every login.
+    """
+    if kwargs.get("update_fields") == frozenset({"last_login"}):
+        return
+    try:
+        invalidate(r, "owners")
+    except redis.RedisError as error:
+        logger.error(f"Signals-Owners: {error}")
+
+
+@receiver(post_save, sender=Server)
+@receiver(post_delete, sender=Server)
+def invalidate_servers(sender, instance, **kwargs) -> None:
+    """
+    Drop the decrypted credential cache of the Celery workers and the
+    owner's cached server list when a server is changed or deleted. Both
+    are dropped once the change is committed, so no concurrent request can
+    cache the old rows again under the new version.
+    """
+    owner_id = instance.owner_id
+
+    def drop() -> None:
+        try:
+            invalidate(r, "servers")
+            bump_servers_version([owner_id])
+        except redis.RedisError as error:
+            logger.error(f"Signals-Servers: {error}")
+
+    transaction.on_commit(drop)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs) -> None:
+    """
+    Drop the cached API token on logout or rotation.
+    """
+    try:
+        cache.delete(token_cache_key(instance.key))
+    except redis.RedisError as error:
+        logger.error(f"Signals-Token: {error}")
+
+
+@receiver(post_save, sender=MonUser)
+def invalidate_user_tokens(sender, instance, **kwargs) -> None:
+    """
+    Drop the cached API tokens of a changed user, so a deactivation or any
+    other change applies to the next request. The last_login update of a
+    login changes nothing the tokens hold.
+    """
+    if kwargs.get("update_fields") == frozenset({"last_login"}):
+        return
+    try:
+        keys = Token.objects.filter(user=instance).values_list("key", flat=True)
+        cache.delete_many([token_cache_key(key) for key in keys])
+    except redis.RedisError as error:
+        logger.error(f"Signals-Token: {error}")
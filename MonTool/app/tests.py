@@ -1,3 +1,100 @@
-from django.test import TestCase
+import math
 
-# Create your tests here.
+import fakeredis
+from django.test import SimpleTestCase
+
+from celery_tasks.gorilla import encode, decode, decode_range
+from celery_tasks.history import History, METRICS
+
+STEP = 30
+DAY = 24 * 3600
+# Midnight UTC, so the first sample starts a block.
+T0 = 1_700_006_400 - 1_700_006_400 % DAY
+
+
+class GorillaTests(SimpleTestCase):
+    """
+    Round trips of the Gorilla block encoding.
+    """
+
+    def assert_round_trip(self, timestamps, values):
+        decoded_ts, decoded_values = decode(encode(timestamps, values))
+        self.assertEqual(list(decoded_ts), timestamps)
+        self.assertEqual(list(decoded_values), values)
+
+    def test_regular_samples(self):
+        timestamps = [T0 + i * STEP for i in range(120)]
+        self.assert_round_trip(timestamps, [float(i % 7) for i in range(120)])
+
+    def test_irregular_timestamps_and_values(self):
+        timestamps = [T0, T0 + 29, T0 + 61, T0 + 1000, T0 + 1001, T0 + 100_000]
+        values = [0.0, -1.5, 1e-9, 3.25e12, math.pi, -0.0]
+        self.assert_round_trip(timestamps, values)
+
+    def test_single_and_empty_blocks(self):
+        self.assert_round_trip([T0], [42.5])
+        self.assert_round_trip([], [])
+
+    def test_decode_range_slices_blocks(self):
+        first = encode([T0 + i * STEP for i in range(10)], [float(i) for i in range(10)])
+        second = encode([T0 + i * STEP for i in range(10, 20)], [float(i) for i in range(10, 20)])
+        timestamps, values = decode_range([first, second], T0 + 5 * STEP, T0 + 14 * STEP)
+        self.assertEqual(list(timestamps), [T0 + i * STEP for i in range(5, 15)])
+        self.assertEqual(list(values), [float(i) for i in range(5, 15)])
+
+
+class HistoryTests(SimpleTestCase):
+    """
+    Ring buffer and archive reads of the stats history.
+    """
+
+    def setUp(self):
+        self.r = fakeredis.FakeRedis()
+        self.history = History(STEP, DAY // STEP, 3600 // STEP, 30 * DAY)
+
+    def record(self, first: int, count: int, server_id=1):
+        for i in range(first, first + count):
+            self.history.record(self.r, server_id, T0 + i * STEP, {metric: i for metric in METRICS})
+
+    def values(self, start: float, end: float, metric="cpu_pct"):
+        return [value for _, value in self.history.range(self.r, 1, metric, start, end)]
+
+    def test_window_ending_now_reads_the_ring(self):
+        self.record(0, 240)
+        now = T0 + 239 * STEP
+        self.assertEqual(self.values(now - 3600, now), [float(i) for i in range(119, 240)])
+
+    def test_past_day_is_read_from_the_archive(self):
+        self.record(0, 2 * DAY // STEP)
+        self.assertEqual(self.values(T0, T0 + DAY - STEP), [float(i) for i in range(DAY // STEP)])
+
+    def test_past_hour_is_read_from_the_archive(self):
+        self.record(0, 2 * DAY // STEP)
+        self.assertEqual(self.values(T0 + 3600, T0 + 7200), [float(i) for i in range(120, 241)])
+
+    def test_window_spanning_archive_and_ring(self):
+        total = 2 * DAY // STEP
+        self.record(0, total)
+        samples = self.history.range(self.r, 1, "cpu_pct", T0, T0 + (total - 1) * STEP)
+        self.assertEqual([value for _, value in samples], [float(i) for i in range(total)])
+        self.assertEqual([ts for ts, _ in samples], [T0 + i * STEP for i in range(total)])
+
+    def test_window_beyond_the_newest_sample(self):
+        self.record(0, 240)
+        self.assertEqual(self.values(T0 + 7170, T0 + 10 * DAY), [239.0])
+
+    def test_gap_does_not_return_the_previous_lap(self):
+        self.record(0, 240)
+        # A day later the ring lapped; the slots of the first hours must not
+        # read as samples of the second day.
+        self.record(DAY // STEP + 360, 10)
+        second_day = self.values(T0 + DAY, T0 + DAY + 4 * 3600)
+        self.assertEqual(second_day, [float(i) for i in range(DAY // STEP + 360, DAY // STEP + 370)])
+
+    def test_samples_older_than_the_ring_are_skipped(self):
+        self.record(DAY // STEP, 10)
+        self.history.record_many(self.r, 1, [(T0, {"cpu_pct": -1}), (T0 + DAY + 10 * STEP, {"cpu_pct": 10})])
+        self.assertNotIn(-1.0, self.values(T0, T0 + 2 * DAY))
+
+    def test_unknown_server_is_empty(self):
+        self.assertEqual(self.values(T0, T0 + DAY), [])
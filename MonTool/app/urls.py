@@ -12,9 +12,13 @@ urlpatterns = [
     path("edit_profile/", views.edit_profile, name="edit_profile"),
     path("add_server/", views.add_server, name="add_server"),
     path("<int:server_id>/", views.server_details, name="server_details"),
+    path("<int:server_id>/stats/", views.server_stats_json, name="server_stats_json"),
+    path("<int:server_id>/stats/stream/", views.server_stats_stream, name="server_stats_stream"),
     path("my_servers/", views.my_servers, name="my_servers"),
+    path("fleet/", views.fleet, name="fleet"),
     path("<int:server_id>/edit_server/", views.edit_server, name="edit_server"),
     path("<int:server_id>/delete_server/", views.delete_server, name="delete_server"),
     path('stop_monitoring/<int:server_id>/', views.stop_monitoring, name='stop_monitoring'),
+    path('monitoring_heartbeat/<int:server_id>/', views.monitoring_heartbeat, name='monitoring_heartbeat'),
     path('tg_integation/', views.tg_integration, name='tg_integration'),
 ]
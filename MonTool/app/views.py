@@ -1,23 +1,41 @@
 from django.contrib import messages
 
-import redis
 from celery.result import AsyncResult
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import login, authenticate, logout as django_logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django_ratelimit.decorators import ratelimit
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from typing import Any
+import asyncio
+import hashlib
+import json
+import time
 from cryptography.fernet import Fernet
 import os
 import logging
 
 from app.forms import SignUpForm, LogInForm, ProfileForm, EditProfileForm, ServerCreateForm, ServerEditForm
 from app.models import MonUser, Profile, Server
-from celery_tasks.tasks import server_stats, active_monitoring_tasks
+from app.decorators import async_login_required, async_ratelimit
+from app.fleet import SORTS, afleet_page
+from app.fragments import aservers_version, servers_fragment_key
+from app.live import StatsHub
+from celery_tasks.connections import r, ar
+from celery_tasks.leases import aacquire, acquire, release, new_lease_id
 
 fernet = Fernet(os.getenv("ENCRYPTION_KEY").encode())
 
+hub = StatsHub(ar)
+
+FLEET_PAGE_SIZE = 100
+
 logger = logging.getLogger("django_web")
 
 
@@ -167,29 +185,49 @@ def add_server(request: Any) -> HttpResponse:
 
 
 @login_required
-def stop_monitoring(request, server_id):
+def monitoring_heartbeat(request: Any, server_id: int) -> JsonResponse:
     """
-    Stop Celery monitoring task 'server_stats' for a given server.
+    Renew the page's lease on the 'server_stats' collector of a given server.
     """
-    if server_id in active_monitoring_tasks:
-        AsyncResult(active_monitoring_tasks[server_id]).revoke(terminate=True)
-        del active_monitoring_tasks[server_id]
-    return JsonResponse({"status": "Monitoring stopped"})
+    if not Server.objects.filter(id=server_id, owner=request.user).exists():
+        return JsonResponse({"detail": "Not found"}, status=404)
+    lease_id = request.POST.get("lease_id") or new_lease_id()
+    viewers = acquire(r, server_id, lease_id, settings.MONITORING_LEASE_TTL)
+    return JsonResponse({"lease_id": lease_id, "viewers": viewers})
 
 
-@ratelimit(key='ip', rate='10/m', method='GET', block=True)
 @login_required
-def server_details(request: Any, server_id: int) -> HttpResponse:
+def stop_monitoring(request: Any, server_id: int) -> JsonResponse:
+    """
+    Release the page's lease on the 'server_stats' collector of a given server.
+    The collector stops once the last lease is released or expires.
+    """
+    if not Server.objects.filter(id=server_id, owner=request.user).exists():
+        return JsonResponse({"detail": "Not found"}, status=404)
+    collector = release(r, server_id, request.POST.get("lease_id", ""))
+    if collector:
+        AsyncResult(collector).revoke()
+        logger.info(f"Views-Server: Monitoring of server(id: {server_id}) stopped")
+    return JsonResponse({"status": "Monitoring stopped" if collector else "Lease released"})
+
+
+@async_ratelimit('10/m')
+@async_login_required
+async def server_details(request: Any, server_id: int) -> HttpResponse:
     """
     Display server details and current monitoring stats.
     """
-    server = Server.objects.get(id=server_id)
+    try:
+        server = await Server.objects.aget(id=server_id, owner=request.user)
+    except Server.DoesNotExist:
+        raise Http404("Server not found")
     try:
         if server.status != "❌Offline":
-            server_stats.delay(server_id)
-            r = redis.Redis(host='redis', port=6379, db=1, decode_responses=True)
-            stats = r.hgetall(f"server:{server_id}")
+            lease_id = request.GET.get("lease_id") or new_lease_id()
+            await aacquire(ar, server_id, lease_id, settings.MONITORING_LEASE_TTL)
+            stats = await ar.hgetall(f"server:{server_id}")
             return render(request, "app/server_details.html", {"server": server,
+                                                               "lease_id": lease_id,
                                                                "free_memory": [stats.get("free_memory"), "MB"],
                                                                "free_disk": [stats.get("free_disk"), "GB"],
                                                                "cpu_load": stats.get("cpu_load")})
@@ -201,20 +239,94 @@ def server_details(request: Any, server_id: int) -> HttpResponse:
                                                        "cpu_load": "❌Offline"})
 
 
-@ratelimit(key='ip', rate='10/m', method='GET', block=True)
-@login_required
-def my_servers(request: Any) -> HttpResponse:
+@async_ratelimit('60/m')
+@async_login_required
+async def server_stats_json(request: Any, server_id: int) -> HttpResponse:
+    """
+    Return the cached monitoring stats of a server as JSON. Only Redis is
+    read, nothing is collected; an unchanged snapshot is answered with 304
+    through its ETag.
+    """
+    if not await Server.objects.filter(id=server_id, owner=request.user).aexists():
+        return JsonResponse({"detail": "Not found"}, status=404)
+    stats = await ar.hgetall(f"server:{server_id}")
+    body = json.dumps({"stats": stats}, sort_keys=True)
+    etag = quote_etag(hashlib.md5(body.encode()).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@async_login_required
+async def server_stats_stream(request: Any, server_id: int) -> HttpResponse:
     """
-    List all servers associated with the logged-in user.
+    Stream the stats of a server as Server-Sent Events: the cached snapshot
+    first, then every sample the collectors publish. The stream ends after
+    SSE_STREAM_TTL seconds and the browser reconnects, which bounds streams
+    left behind by closed tabs.
+    """
+    if not await Server.objects.filter(id=server_id, owner=request.user).aexists():
+        return JsonResponse({"detail": "Not found"}, status=404)
+
+    async def events():
+        queue = await hub.subscribe(server_id)
+        try:
+            yield f"retry: 3000\nevent: stats\ndata: {json.dumps(await ar.hgetall(f'server:{server_id}'))}\n\n"
+            deadline = time.monotonic() + settings.SSE_STREAM_TTL
+            while time.monotonic() < deadline:
+                try:
+                    data = await asyncio.wait_for(queue.get(), timeout=settings.SSE_KEEPALIVE)
+                    yield f"event: stats\ndata: {data}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            await hub.unsubscribe(server_id, queue)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@async_ratelimit('10/m')
+@async_login_required
+async def my_servers(request: Any) -> HttpResponse:
+    """
+    List all servers associated with the logged-in user. The rendered list
+    is cached per user under the version bumped whenever one of their
+    servers changes, so repeat visits skip the query and the rendering.
     """
     try:
-        user = MonUser.objects.get(id=request.user.id)
-        servers = Server.objects.filter(owner=user).order_by('-created_at')
-        return render(request, "app/my_servers.html", {"servers": servers})
+        key = servers_fragment_key(request.user.id, await aservers_version(request.user.id))
+        servers_html = await cache.aget(key)
+        if servers_html is None:
+            servers = [server async for server in Server.objects.filter(owner=request.user).order_by('-created_at')]
+            servers_html = render_to_string("app/server_list.html", {"servers": servers})
+            await cache.aset(key, servers_html, settings.MY_SERVERS_CACHE_TTL)
+        return render(request, "app/my_servers.html", {"servers_html": mark_safe(servers_html)})
     except Exception as error:
         logger.error(f"Views-Servers: {error}")
 
 
+@async_ratelimit('30/m')
+@async_login_required
+async def fleet(request: Any) -> HttpResponse:
+    """
+    Show the status and latest metrics of all the user's servers, worst first
+    or by name, a page at a time.
+    """
+    sort = request.GET.get("sort") if request.GET.get("sort") in SORTS else "worst"
+    try:
+        rows, next_cursor = await afleet_page(ar, request.user, sort, request.GET.get("after"), FLEET_PAGE_SIZE)
+    except ValueError as error:
+        logger.error(f"Views-Fleet: {error}")
+        rows, next_cursor = await afleet_page(ar, request.user, sort, None, FLEET_PAGE_SIZE)
+    return render(request, "app/fleet.html", {"rows": rows, "sort": sort, "next_cursor": next_cursor})
+
+
 @ratelimit(key='ip', rate='10/m', method='GET', block=True)
 @login_required
 def edit_server(request: Any, server_id: int) -> HttpResponse:
@@ -0,0 +1,48 @@
+import time
+
+BREAKER_KEY = "breaker:{}"
+
+# Count one more failure and open the breaker for base * 2^(failures - 1)
+# seconds, capped; the key outlives the open period so the failure count
+# keeps growing while the host stays unreachable.
+FAILURE = """
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+local backoff = math.min(tonumber(ARGV[3]), tonumber(ARGV[2]) * 2 ^ (failures - 1))
+redis.call('HSET', KEYS[1], 'open_until', tonumber(ARGV[1]) + backoff)
+redis.call('EXPIRE', KEYS[1], math.ceil(backoff) + tonumber(ARGV[3]))
+return {failures, tostring(backoff)}
+"""
+
+
+def queue_state(pipe, server_id) -> None:
+    """
+    Queue the read of a server's breaker state on a pipeline; its reply goes
+    to `is_open`.
+    """
+    pipe.hmget(BREAKER_KEY.format(server_id), "failures", "open_until")
+
+
+def is_open(state, now: float = None) -> bool:
+    """
+    Tell whether the breaker blocks connections right now. Once the backoff
+    has passed it lets one attempt through (half-open); its outcome either
+    closes the breaker or opens it for longer.
+    """
+    open_until = state[1]
+    return bool(open_until) and float(open_until) > (now or time.time())
+
+
+def record_failure(r, server_id, base: float, cap: float):
+    """
+    Count a failed connection and open the breaker with exponential backoff.
+    Returns the failure count and the backoff in seconds.
+    """
+    failures, backoff = r.eval(FAILURE, 1, BREAKER_KEY.format(server_id), time.time(), base, cap)
+    return int(failures), float(backoff)
+
+
+def record_success(r, server_id) -> None:
+    """
+    Close the breaker of a server that answered again.
+    """
+    r.delete(BREAKER_KEY.format(server_id))
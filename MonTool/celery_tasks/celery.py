@@ -1,20 +1,59 @@
+import logging
 import os
 from datetime import timedelta
 
 from celery import Celery
-from celery.signals import setup_logging
+from celery.signals import setup_logging, before_task_publish, task_prerun, beat_init
+from kombu import Exchange, Queue
+
+from celery_tasks.queue_stats import PRIORITY_STEPS, PRIORITY_SEP, mark_published, record_latency
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "MonTool.settings")
 
+logger = logging.getLogger("celery")
+
 app=Celery("celery_app")
 
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.autodiscover_tasks(["celery_tasks"])
 
+# Availability sweeps, SSH collections and metric warehouse jobs each get a
+# queue consumed by its own worker pool (see docker-compose.yml), so slow SSH
+# hosts never delay the ping sweep. Lower priority numbers run first.
+QUEUES = ("probe", "collect", "metrics")
+
+app.conf.task_queues = [Queue(name, Exchange(name), routing_key=name) for name in QUEUES]
+app.conf.task_default_queue = "collect"
+app.conf.task_routes = {
+    "celery_tasks.tasks.connection_quality": {"queue": "probe", "priority": 0},
+    "celery_tasks.tasks.server_stats": {"queue": "collect", "priority": 3},
+    "celery_tasks.tasks.flush_metrics": {"queue": "metrics", "priority": 0},
+    "celery_tasks.tasks.rollup_metrics": {"queue": "metrics", "priority": 6},
+    "celery_tasks.tasks.manage_metric_partitions": {"queue": "metrics", "priority": 9},
+    "celery_tasks.tasks.expire_metric_rollups": {"queue": "metrics", "priority": 9},
+}
+app.conf.broker_transport_options = {
+    "queue_order_strategy": "priority",
+    "priority_steps": PRIORITY_STEPS,
+    "sep": PRIORITY_SEP,
+}
+
 app.conf.beat_schedule = {
     "connection_quality": {"task": "celery_tasks.tasks.connection_quality",
-                  "schedule": timedelta(minutes=1)},
+                  "schedule": timedelta(minutes=1), "options": {"expires": 60}},
+    "flush_metrics": {"task": "celery_tasks.tasks.flush_metrics",
+                      "schedule": timedelta(seconds=10), "options": {"expires": 10}},
+    "rollup_metrics_1m": {"task": "celery_tasks.tasks.rollup_metrics",
+                          "schedule": timedelta(minutes=1), "args": ("1m",)},
+    "rollup_metrics_1h": {"task": "celery_tasks.tasks.rollup_metrics",
+                          "schedule": timedelta(minutes=15), "args": ("1h",)},
+    "rollup_metrics_1d": {"task": "celery_tasks.tasks.rollup_metrics",
+                          "schedule": timedelta(hours=1), "args": ("1d",)},
+    "manage_metric_partitions": {"task": "celery_tasks.tasks.manage_metric_partitions",
+                                 "schedule": timedelta(hours=1)},
+    "expire_metric_rollups": {"task": "celery_tasks.tasks.expire_metric_rollups",
+                              "schedule": timedelta(hours=1)},
 }
 
 @setup_logging.connect
@@ -25,3 +64,33 @@ def configure_logging(*args, **kwargs):
     from logging.config import dictConfig
     from django.conf import settings
     dictConfig(settings.LOGGING)
+
+
+@before_task_publish.connect
+def stamp_published(headers=None, **kwargs):
+    """
+    Stamp every task message with its publish time for queue latency stats.
+    """
+    if headers is not None:
+        mark_published(headers)
+
+
+@task_prerun.connect
+def track_latency(task=None, **kwargs):
+    """
+    Record the queue latency of every started task.
+    """
+    from celery_tasks.connections import r
+    try:
+        record_latency(r, task.request)
+    except Exception as error:
+        logger.error(f"Error during queue latency recording - {error}")
+
+
+@beat_init.connect
+def prepare_partitions(sender=None, **kwargs):
+    """
+    Check the metric partitions once when beat starts instead of waiting for
+    the first hourly run.
+    """
+    sender.app.send_task("celery_tasks.tasks.manage_metric_partitions")
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging.config import dictConfig
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MonTool.settings')
+
+from django.conf import settings
+
+METRICS_KEY = "collector:metrics"
+
+logger = logging.getLogger("celery")
+
+
+class Collector:
+    """
+    Fleet-wide collector multiplexing SSH collections over a bounded number
+    of threads.
+
+    Every server in the database is collected once per interval, whether or
+    not anyone watches it, from the monitoring:fleet schedule it reconciles
+    with the Server table every interval; viewer leases play no part. It
+    writes the same server:{id} hashes through `collect`, so it replaces the
+    'scheduler' service rather than running next to it. The 'collector'
+    compose profile only adds this service; start it with
+    `docker compose --profile collector up --scale scheduler=0`. Throughput
+    and lag counters are published to the collector:metrics hash for sizing.
+    """
+
+    def __init__(self, r, collect, server_ids, concurrency: int, interval: float):
+        self.r = r
+        self.collect = collect
+        self.server_ids = server_ids
+        self.concurrency = concurrency
+        self.interval = interval
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="collector")
+        self.in_flight = set()
+        self.collected = 0
+        self.failed = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.window_started = time.monotonic()
+        self.reconciled = 0.0
+
+    def reconcile(self) -> None:
+        """
+        Bring the fleet-wide schedule in line with the servers in the database.
+        """
+        from celery_tasks.scheduler import reconcile_fleet
+
+        added, removed = reconcile_fleet(self.r, self.server_ids(), self.interval)
+        if added or removed:
+            logger.info(f"Collector schedule - {added} server(s) added, {removed} removed")
+        self.reconciled = time.monotonic()
+
+    async def collect_one(self, server_id: int, due: float) -> None:
+        """
+        Run one blocking collection on the thread pool and account for it.
+        """
+        lag = time.time() - due
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.collect, server_id)
+            self.collected += 1
+        except Exception as error:
+            self.failed += 1
+            logger.error(f"Error during collection of server(id: {server_id}) - {error}")
+
+    def report(self) -> None:
+        """
+        Publish the counters of the last window and start a new one.
+        """
+        elapsed = time.monotonic() - self.window_started
+        done = self.collected + self.failed
+        metrics = {
+            "collected": self.collected,
+            "failed": self.failed,
+            "in_flight": len(self.in_flight),
+            "throughput": round(done / elapsed, 2) if elapsed else 0,
+            "lag_avg": round(self.lag_total / done, 3) if done else 0,
+            "lag_max": round(self.lag_max, 3),
+            "updated": int(time.time()),
+        }
+        self.r.hset(METRICS_KEY, mapping=metrics)
+        logger.info(f"Collector metrics - {metrics}")
+        self.collected = self.failed = 0
+        self.lag_total = self.lag_max = 0.0
+        self.window_started = time.monotonic()
+
+    async def run(self) -> None:
+        """
+        Take due servers while there is spare concurrency and collect them.
+        """
+        from celery_tasks.scheduler import FLEET_KEY, pop_fleet_due, seconds_until_next
+
+        while True:
+            try:
+                if time.monotonic() - self.reconciled >= self.interval:
+                    await asyncio.to_thread(self.reconcile)
+                free = self.concurrency - len(self.in_flight)
+                due = await asyncio.to_thread(pop_fleet_due, self.r, self.interval, free) if free else []
+                for server_id, due_at in due:
+                    task = asyncio.create_task(self.collect_one(server_id, due_at))
+                    self.in_flight.add(task)
+                    task.add_done_callback(self.in_flight.discard)
+                if time.monotonic() - self.window_started >= self.interval:
+                    await asyncio.to_thread(self.report)
+                wait = await asyncio.to_thread(seconds_until_next, self.r, 1.0, FLEET_KEY) if free > len(due) else 0.1
+                await asyncio.sleep(wait)
+            except Exception as error:
+                logger.error(f"Error within collector daemon - {error}")
+                await asyncio.sleep(1)
+
+
+if __name__ == "__main__":
+    django.setup()
+    dictConfig(settings.LOGGING)
+
+    from app.models import Server
+    from celery_tasks.tasks import collect, r
+
+    def server_ids():
+        return list(Server.objects.values_list("id", flat=True))
+
+    logger.info("Collector daemon is running...")
+    asyncio.run(Collector(r, collect, server_ids, settings.COLLECTOR_CONCURRENCY, settings.MONITORING_INTERVAL).run())
@@ -0,0 +1,26 @@
+import os
+
+import redis
+import redis.asyncio as aioredis
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MonTool.settings')
+
+from django.conf import settings
+
+# One blocking pool per response mode, shared by every module of a process,
+# so collector threads and views wait for a free connection instead of each
+# module opening its own.
+pool = redis.BlockingConnectionPool(host='redis', port=6379, db=1, decode_responses=True,
+                                    max_connections=settings.REDIS_MAX_CONNECTIONS, timeout=10)
+binary_pool = redis.BlockingConnectionPool(host='redis', port=6379, db=1,
+                                           max_connections=settings.REDIS_MAX_CONNECTIONS, timeout=10)
+
+r = redis.Redis(connection_pool=pool)
+rb = redis.Redis(connection_pool=binary_pool)
+
+# Async counterpart for ASGI views; its connections are bound to the event
+# loop of the first request, which is the only loop of a uvicorn worker.
+async_pool = aioredis.BlockingConnectionPool(host='redis', port=6379, db=1, decode_responses=True,
+                                             max_connections=settings.REDIS_MAX_CONNECTIONS, timeout=10)
+
+ar = aioredis.Redis(connection_pool=async_pool)
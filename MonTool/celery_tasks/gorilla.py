@@ -0,0 +1,177 @@
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Delta-of-delta buckets: (control bits, control length, value bits).
+DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+
+class BitWriter:
+    """
+    Append-only bit stream backed by a Python int.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.length = 0
+
+    def write(self, bits: int, length: int) -> None:
+        """
+        Append the lowest `length` bits of `bits`.
+        """
+        self.value = (self.value << length) | (bits & ((1 << length) - 1))
+        self.length += length
+
+    def to_bytes(self) -> bytes:
+        """
+        Return the stream padded with zero bits to a whole number of bytes.
+        """
+        padding = -self.length % 8
+        return (self.value << padding).to_bytes((self.length + padding) // 8, "big")
+
+
+class BitReader:
+    """
+    Sequential reader over a bit stream written by BitWriter.
+    """
+
+    def __init__(self, data: bytes, position: int = 0):
+        self.data = data
+        self.position = position
+
+    def read(self, length: int) -> int:
+        """
+        Read the next `length` bits as an unsigned int.
+        """
+        if not length:
+            return 0
+        first, last = self.position >> 3, (self.position + length + 7) >> 3
+        chunk = int.from_bytes(self.data[first:last], "big")
+        shift = (last - first) * 8 - (self.position & 7) - length
+        self.position += length
+        return (chunk >> shift) & ((1 << length) - 1)
+
+
+def float_bits(value: float) -> int:
+    """
+    Reinterpret a float as its IEEE 754 64-bit pattern.
+    """
+    return struct.unpack(">Q", struct.pack(">d", value))[0]
+
+
+def bits_float(bits: int) -> float:
+    """
+    Reinterpret a 64-bit pattern as a float.
+    """
+    return struct.unpack(">d", struct.pack(">Q", bits))[0]
+
+
+def encode(timestamps, values) -> bytes:
+    """
+    Compress a block of samples with Gorilla encoding: delta-of-delta
+    timestamps and XOR-ed float values.
+    """
+    out = BitWriter()
+    out.write(len(timestamps), 32)
+    if not timestamps:
+        return out.to_bytes()
+    out.write(int(timestamps[0]), 64)
+    previous_bits = float_bits(values[0])
+    out.write(previous_bits, 64)
+    previous_ts, previous_delta = int(timestamps[0]), 0
+    leading, trailing = 65, 0
+
+    for ts, value in zip(timestamps[1:], values[1:]):
+        delta = int(ts) - previous_ts
+        dod = delta - previous_delta
+        previous_ts, previous_delta = int(ts), delta
+        if dod == 0:
+            out.write(0, 1)
+        else:
+            for control, control_length, length in DOD_BUCKETS:
+                if -(1 << (length - 1)) < dod <= 1 << (length - 1):
+                    out.write(control, control_length)
+                    out.write(dod - 1 if dod > 0 else dod, length)
+                    break
+            else:
+                out.write(0b1111, 4)
+                out.write(dod, 64)
+
+        bits = float_bits(value)
+        xor = bits ^ previous_bits
+        previous_bits = bits
+        if xor == 0:
+            out.write(0, 1)
+            continue
+        out.write(1, 1)
+        new_leading = min(64 - xor.bit_length(), 31)
+        new_trailing = (xor & -xor).bit_length() - 1
+        if new_leading >= leading and new_trailing >= trailing:
+            out.write(0, 1)
+            out.write(xor >> trailing, 64 - leading - trailing)
+        else:
+            leading, trailing = new_leading, new_trailing
+            meaningful = 64 - leading - trailing
+            out.write(1, 1)
+            out.write(leading, 5)
+            out.write(meaningful & 0x3F, 6)
+            out.write(xor >> trailing, meaningful)
+    return out.to_bytes()
+
+
+def signed(value: int, length: int) -> int:
+    """
+    Interpret a two's complement field of the given length.
+    """
+    return value - (1 << length) if value >> (length - 1) else value
+
+
+def decode(data: bytes):
+    """
+    Decompress a block into parallel timestamp and value arrays.
+    """
+    reader = BitReader(data)
+    count = reader.read(32)
+    timestamps, values = array("q"), array("d")
+    if not count:
+        return timestamps, values
+    ts, bits = reader.read(64), reader.read(64)
+    timestamps.append(ts)
+    values.append(bits_float(bits))
+    delta, leading, trailing = 0, 0, 0
+
+    for _ in range(count - 1):
+        if reader.read(1):
+            for _, control_length, length in DOD_BUCKETS:
+                if not reader.read(1):
+                    dod = signed(reader.read(length), length)
+                    dod = dod + 1 if dod >= 0 else dod
+                    break
+            else:
+                dod = signed(reader.read(64), 64)
+            delta += dod
+        ts += delta
+        timestamps.append(ts)
+
+        if reader.read(1):
+            if reader.read(1):
+                leading = reader.read(5)
+                meaningful = reader.read(6) or 64
+                trailing = 64 - leading - meaningful
+            bits ^= reader.read(64 - leading - trailing) << trailing
+        values.append(bits_float(bits))
+    return timestamps, values
+
+
+def decode_range(blocks, start: float, end: float):
+    """
+    Decode whole blocks and slice out the samples within [start, end]; each
+    block is time-ordered, so its bounds are found by bisection.
+    """
+    timestamps, values = array("q"), array("d")
+    for block in blocks:
+        block_ts, block_values = decode(block)
+        first, last = bisect_left(block_ts, start), bisect_right(block_ts, end)
+        timestamps.extend(block_ts[first:last])
+        values.extend(block_values[first:last])
+    return timestamps, values
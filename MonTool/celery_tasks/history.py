@@ -0,0 +1,226 @@
+import struct
+
+from celery_tasks.gorilla import encode, decode_range
+
+METRICS = ("free_memory", "free_disk", "cpu_load", "cpu_pct",
+           "net_rx_bps", "net_tx_bps", "disk_read_bps", "disk_write_bps")
+
+# Every slot holds a float32 sample value, NaN meaning "no sample". The
+# ring is made of whole blocks and the writer resets a block to NaN when the
+# ring moves into it, so slots left over from the previous lap never read as
+# fresh samples and no slot needs a lap counter of its own.
+SLOT = struct.Struct("<f")
+EMPTY = SLOT.pack(float("nan"))
+
+# KEYS: the ring buffers of every metric, then the server's block key.
+# ARGV: block of the newest sample, blocks in the ring, one block of empty
+# slots, buffer TTL and block key TTL. Resets the blocks the ring entered
+# since the previous write (every block of a missing buffer), keeps the
+# newest block in the block key and returns the previous one.
+ADVANCE = """
+local block_key = KEYS[#KEYS]
+local block, blocks, empty = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3]
+local previous = redis.call('GET', block_key)
+local first = block - blocks + 1
+if previous then first = math.max(first, tonumber(previous) + 1) end
+for i = 1, #KEYS - 1 do
+    local from = first
+    if redis.call('EXISTS', KEYS[i]) == 0 then from = block - blocks + 1 end
+    for b = from, block do
+        redis.call('SETRANGE', KEYS[i], (b % blocks) * #empty, empty)
+    end
+    redis.call('EXPIRE', KEYS[i], ARGV[4])
+end
+local newest = block
+if previous then newest = math.max(block, tonumber(previous)) end
+redis.call('SET', block_key, newest, 'EX', ARGV[5])
+return previous
+"""
+
+class History:
+    """
+    Fixed-size per-server, per-metric ring buffers packed into Redis strings,
+    backed by a Gorilla-compressed archive for longer retention.
+
+    A sample at time `ts` lives in slot (ts // step) % capacity of the
+    history:{server id}:{metric}:ring string, so appending is a single
+    SETRANGE and a time range maps to at most two contiguous GETRANGE spans.
+    At 4 bytes a slot, a day of 30 s samples takes 11.5 KB per metric, about
+    92 KB per server. Whenever a block of `block_size` slots is complete it
+    is compressed and added to the history:{server id}:{metric}:blocks
+    sorted set, scored by its start.
+    """
+
+    def __init__(self, step: int, capacity: int, block_size: int, archive_retention: int):
+        if capacity % block_size:
+            raise ValueError("History retention must be a whole number of blocks")
+        self.step = step
+        self.capacity = capacity
+        self.block_size = block_size
+        self.blocks = capacity // block_size
+        self.archive_retention = archive_retention
+
+    @classmethod
+    def from_settings(cls, settings) -> "History":
+        """
+        Build the history store configured in the Django settings.
+        """
+        return cls(settings.HISTORY_STEP, settings.HISTORY_RETENTION // settings.HISTORY_STEP,
+                   settings.HISTORY_BLOCK // settings.HISTORY_STEP, settings.HISTORY_ARCHIVE_RETENTION)
+
+    @staticmethod
+    def key(server_id, metric: str) -> str:
+        """
+        Return the Redis key of a metric's ring buffer.
+        """
+        return f"history:{server_id}:{metric}:ring"
+
+    @staticmethod
+    def block_key(server_id) -> str:
+        """
+        Return the Redis key of the newest block written for a server.
+        """
+        return f"history:{server_id}:block"
+
+    @staticmethod
+    def archive_key(server_id, metric: str) -> str:
+        """
+        Return the Redis key of a metric's compressed block archive.
+        """
+        return f"history:{server_id}:{metric}:blocks"
+
+    def append(self, pipe, server_id, ts: float, values) -> None:
+        """
+        Queue the SETRANGE writes of one sample of every known metric on a
+        (binary) Redis pipeline.
+        """
+        offset = (int(ts) // self.step % self.capacity) * SLOT.size
+        for metric in METRICS:
+            try:
+                value = float(values[metric])
+            except (KeyError, TypeError, ValueError):
+                continue
+            pipe.setrange(self.key(server_id, metric), offset, SLOT.pack(value))
+
+    def spans(self, start: float, end: float):
+        """
+        Map a time range to the (first tick, byte offset, slot count) spans
+        covering it, clipped to the buffer's retention.
+        """
+        last = int(end) // self.step
+        first = max(int(start) // self.step, last - self.capacity + 1)
+        spans = []
+        tick = first
+        while tick <= last:
+            index = tick % self.capacity
+            count = min(last - tick + 1, self.capacity - index)
+            spans.append((tick, index * SLOT.size, count))
+            tick += count
+        return spans
+
+    def read_ring(self, r, server_id, metrics, start: float, end: float):
+        """
+        Read the (timestamp, value) samples of several metrics within
+        [start, end] from their ring buffers in one round trip.
+        """
+        spans = self.spans(start, end)
+        pipe = r.pipeline(transaction=False)
+        for metric in metrics:
+            for _, offset, count in spans:
+                pipe.getrange(self.key(server_id, metric), offset, offset + count * SLOT.size - 1)
+        results = iter(pipe.execute())
+        samples = {}
+        for metric in metrics:
+            samples[metric] = []
+            for first, _, _ in spans:
+                data = next(results)
+                for i, (value,) in enumerate(SLOT.iter_unpack(data[:len(data) - len(data) % SLOT.size])):
+                    if value == value:
+                        samples[metric].append(((first + i) * self.step, value))
+        return samples
+
+    def record(self, r, server_id, ts: float, values) -> None:
+        """
+        Append one sample and archive the previous block once a new one starts.
+        """
+        self.record_many(r, server_id, [(ts, values)])
+
+    def record_many(self, r, server_id, samples) -> None:
+        """
+        Append time-ordered (timestamp, values) samples in one round trip and
+        archive every block completed since the last recorded one.
+        """
+        if not samples:
+            return
+        pipe = r.pipeline(transaction=False)
+        block, index = self.queue(pipe, server_id, samples)
+        self.seal_completed(r, server_id, pipe.execute()[index], block)
+
+    def queue(self, pipe, server_id, samples):
+        """
+        Queue the writes of time-ordered (timestamp, values) samples on a
+        pipeline, after advancing the ring to the block of the newest one.
+        Samples older than the ring are skipped. Returns the new block number
+        and the pipeline index of the reply `seal_completed` takes.
+        """
+        block = int(samples[-1][0]) // self.step // self.block_size
+        keys = [self.key(server_id, metric) for metric in METRICS] + [self.block_key(server_id)]
+        pipe.eval(ADVANCE, len(keys), *keys, block, self.blocks, EMPTY * self.block_size,
+                  self.capacity * self.step, self.archive_retention)
+        index = len(pipe) - 1
+        oldest = (block + 1) * self.block_size - self.capacity
+        for ts, values in samples:
+            if int(ts) // self.step >= oldest:
+                self.append(pipe, server_id, ts, values)
+        return block, index
+
+    def seal_completed(self, r, server_id, previous, block: int) -> None:
+        """
+        Archive the blocks completed between the previously recorded block
+        and the current one.
+        """
+        if previous is None or int(previous) >= block:
+            return
+        oldest = block - self.blocks + 1
+        for sealed in range(max(int(previous), oldest), block):
+            self.seal(r, server_id, sealed)
+
+    def seal(self, r, server_id, block: int) -> None:
+        """
+        Compress one complete block of every metric into its archive.
+        """
+        start = block * self.block_size * self.step
+        end = start + self.block_size * self.step - 1
+        samples = self.read_ring(r, server_id, METRICS, start, end)
+        pipe = r.pipeline(transaction=False)
+        for metric, metric_samples in samples.items():
+            if not metric_samples:
+                continue
+            key = self.archive_key(server_id, metric)
+            pipe.zremrangebyscore(key, "-inf", f"({end + 1 - self.archive_retention}")
+            pipe.zremrangebyscore(key, start, start)
+            pipe.zadd(key, {encode(*zip(*metric_samples)): start})
+            pipe.expire(key, self.archive_retention)
+        pipe.execute()
+
+    def range(self, r, server_id, metric: str, start: float, end: float):
+        """
+        Read the (timestamp, value) samples of a metric within [start, end].
+        The ring covers the blocks up to the newest one written; anything
+        older is read from the archive.
+        """
+        newest = r.get(self.block_key(server_id))
+        if newest is None:
+            ring_start = ring_end = int(end) + 1
+        else:
+            ring_end = (int(newest) + 1) * self.block_size * self.step - 1
+            ring_start = ring_end + 1 - self.capacity * self.step
+        samples = []
+        if start < ring_start:
+            block_seconds = self.block_size * self.step
+            blocks = r.zrangebyscore(self.archive_key(server_id, metric), start - block_seconds,
+                                     min(end, ring_start - 1))
+            samples = list(zip(*decode_range(blocks, start, min(end, ring_start - 1))))
+        if end >= ring_start and start <= ring_end:
+            samples += self.read_ring(r, server_id, [metric], max(start, ring_start), min(end, ring_end))[metric]
+        return samples
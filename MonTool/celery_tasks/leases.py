@@ -0,0 +1,74 @@
+import time
+import uuid
+
+from celery_tasks.scheduler import SCHEDULE_KEY, COLLECTORS_KEY, LEASE_KEY, schedule
+
+# Drop one lease and, if no unexpired lease is left, stop collecting the
+# server and hand back the task id of its collector so it can be revoked.
+RELEASE = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+if redis.call('ZCARD', KEYS[1]) > 0 then
+    return false
+end
+redis.call('ZREM', KEYS[2], ARGV[3])
+local collector = redis.call('HGET', KEYS[3], ARGV[3])
+redis.call('HDEL', KEYS[3], ARGV[3])
+return collector
+"""
+
+
+def new_lease_id() -> str:
+    """
+    Generate an id for a new viewer lease.
+    """
+    return uuid.uuid4().hex
+
+
+def queue_acquire(pipe, server_id, lease_id: str, ttl: int) -> None:
+    """
+    Queue the lease renewal and the scheduling of the server on a
+    transactional pipeline; the live lease count is its third reply.
+    """
+    key = f"{LEASE_KEY}{server_id}"
+    now = time.time()
+    pipe.zadd(key, {lease_id: now + ttl})
+    pipe.zremrangebyscore(key, "-inf", now)
+    pipe.zcard(key)
+    pipe.expire(key, ttl)
+    schedule(pipe, server_id)
+
+
+def acquire(r, server_id, lease_id: str, ttl: int) -> int:
+    """
+    Take or renew a viewer lease on the server's collector and make sure the
+    server is being collected. Returns the number of live leases.
+    """
+    pipe = r.pipeline()
+    queue_acquire(pipe, server_id, lease_id, ttl)
+    return pipe.execute()[2]
+
+
+async def aacquire(ar, server_id, lease_id: str, ttl: int) -> int:
+    """
+    Async variant of `acquire` for an asyncio Redis client.
+    """
+    pipe = ar.pipeline()
+    queue_acquire(pipe, server_id, lease_id, ttl)
+    return (await pipe.execute())[2]
+
+
+def release(r, server_id, lease_id: str):
+    """
+    Drop a viewer lease. Returns the task id of the server's collector if
+    this was the last live lease, otherwise None.
+    """
+    return r.eval(RELEASE, 3, f"{LEASE_KEY}{server_id}", SCHEDULE_KEY, COLLECTORS_KEY,
+                  lease_id, time.time(), server_id)
+
+
+def is_collector(r, server_id, task_id: str) -> bool:
+    """
+    Tell whether the task is the current collector of the server.
+    """
+    return r.hget(COLLECTORS_KEY, server_id) == task_id
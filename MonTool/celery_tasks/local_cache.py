@@ -0,0 +1,55 @@
+import time
+
+GENERATION_KEY = "cache_generation:{}"
+
+
+class LocalCache:
+    """
+    Worker-local dict cache with an optional TTL per entry.
+
+    Other processes cannot reach this memory, so they invalidate it by bumping
+    a generation counter in Redis (see `invalidate`); `sync` drops every entry
+    once the generation it was filled under has changed.
+    """
+
+    def __init__(self, name: str, ttl: float = None):
+        self.name = name
+        self.ttl = ttl
+        self.entries = {}
+        self.generation = None
+
+    def sync(self, r) -> None:
+        """
+        Clear the cache if it was invalidated since the last call.
+        """
+        generation = r.get(GENERATION_KEY.format(self.name))
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+
+    def get_many(self, keys):
+        """
+        Return the cached, unexpired values for the given keys.
+        """
+        now = time.monotonic()
+        hits = {}
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry and (entry[0] is None or entry[0] > now):
+                hits[key] = entry[1]
+        return hits
+
+    def set_many(self, mapping) -> None:
+        """
+        Cache every key/value pair of the mapping.
+        """
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        for key, value in mapping.items():
+            self.entries[key] = (expires, value)
+
+
+def invalidate(r, name: str) -> None:
+    """
+    Invalidate the named cache in every worker process.
+    """
+    r.incr(GENERATION_KEY.format(name))
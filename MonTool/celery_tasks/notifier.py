@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from logging.config import dictConfig
+
+import redis.asyncio as aioredis
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import NetworkError, RetryAfter
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MonTool.settings')
+
+from django.conf import settings
+
+QUEUE_KEY = "notifications"
+
+# Telegram rejects longer messages with BadRequest.
+MESSAGE_LIMIT = 4096
+
+logger = logging.getLogger("celery")
+
+
+def enqueue(r, alerts) -> None:
+    """
+    Push (chat_id, text) alerts onto the notification queue in one command.
+    """
+    if alerts:
+        r.rpush(QUEUE_KEY, *(json.dumps({"chat_id": chat_id, "text": text}) for chat_id, text in alerts))
+
+
+def chunks(texts, limit: int = MESSAGE_LIMIT):
+    """
+    Group alert texts, one per line, into messages of at most `limit`
+    characters; a single longer alert is cut to the limit.
+    """
+    messages, current, size = [], [], 0
+    for text in texts:
+        text = text[:limit]
+        if current and size + 1 + len(text) > limit:
+            messages.append(current)
+            current, size = [], 0
+        size += len(text) + (1 if current else 0)
+        current.append(text)
+    if current:
+        messages.append(current)
+    return messages
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate` messages per second with bursts of `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def full(self) -> bool:
+        """
+        Tell whether the bucket has refilled completely.
+        """
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+    async def take(self) -> None:
+        """
+        Wait until a token is available and consume it.
+        """
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Dispatcher:
+    """
+    Long-lived consumer of the notification queue.
+
+    Alerts for the same chat that are queued together are merged into as few
+    messages as Telegram's length limit allows, and every send goes through a global and a per-chat token bucket
+    so Telegram's flood limits are respected. One Bot session is reused for
+    the whole life of the process.
+    """
+
+    def __init__(self, r, bot: Bot, batch_size: int = 500):
+        self.r = r
+        self.bot = bot
+        self.batch_size = batch_size
+        self.global_bucket = TokenBucket(settings.TG_GLOBAL_RATE, settings.TG_GLOBAL_RATE)
+        self.chat_buckets = defaultdict(lambda: TokenBucket(settings.TG_CHAT_RATE, 1))
+
+    async def next_batch(self):
+        """
+        Block until at least one alert is queued, then drain up to a batch.
+        """
+        item = await self.r.blpop([QUEUE_KEY], timeout=5)
+        if not item:
+            return []
+        rest = await self.r.lpop(QUEUE_KEY, self.batch_size - 1) or []
+        return [json.loads(raw) for raw in [item[1], *rest]]
+
+    async def send(self, chat_id, texts) -> None:
+        """
+        Send the merged alerts of one chat, split into messages within
+        Telegram's length limit, requeueing the unsent ones on flood control.
+        """
+        messages = chunks(texts)
+        for index, message in enumerate(messages):
+            await self.chat_buckets[chat_id].take()
+            await self.global_bucket.take()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text="\n".join(message), parse_mode=ParseMode.HTML)
+                logger.info(f"Tg notification with {len(message)} alert(s) is sent")
+            except RetryAfter as error:
+                logger.warning(f"Telegram flood control, retrying in {error.retry_after}s")
+                await asyncio.sleep(error.retry_after if isinstance(error.retry_after, (int, float))
+                                    else error.retry_after.total_seconds())
+                unsent = [text for rest in messages[index:] for text in rest]
+                await self.r.rpush(QUEUE_KEY, *(json.dumps({"chat_id": chat_id, "text": text}) for text in unsent))
+                return
+            except (RuntimeError, NetworkError) as error:
+                logger.error(f"Error during tg notification delivery - {error}")
+
+    async def run(self) -> None:
+        """
+        Drain the queue forever.
+        """
+        while True:
+            try:
+                batch = await self.next_batch()
+                texts_by_chat = defaultdict(list)
+                for alert in batch:
+                    if alert["text"] not in texts_by_chat[alert["chat_id"]]:
+                        texts_by_chat[alert["chat_id"]].append(alert["text"])
+                await asyncio.gather(*(self.send(chat_id, texts) for chat_id, texts in texts_by_chat.items()))
+                for chat_id in [chat_id for chat_id, bucket in self.chat_buckets.items() if bucket.full()]:
+                    del self.chat_buckets[chat_id]
+            except Exception as error:
+                logger.error(f"Error within notification dispatcher - {error}")
+                await asyncio.sleep(1)
+
+
+async def main() -> None:
+    """
+    Run the notification dispatcher with a single shared Bot session.
+    """
+    r = aioredis.Redis(host='redis', port=6379, db=1, decode_responses=True)
+    async with Bot(token=os.getenv("TOKEN")) as bot:
+        logger.info("Notification dispatcher is running...")
+        await Dispatcher(r, bot).run()
+
+
+if __name__ == "__main__":
+    dictConfig(settings.LOGGING)
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+import logging
+import threading
+
+import paramiko
+
+from celery_tasks.server_ssh import pool
+
+logger = logging.getLogger("celery")
+
+SESSION_COMMAND = "powershell -NoLogo -NoProfile -NonInteractive -Command -"
+
+# Sent once when a session starts. Every "Sample <seq>" line sent afterwards
+# is answered with one "MT <seq> <free memory MB> <total memory MB>
+# <free disk GB> <CPU load %>" line, or "MT <seq> ERR <message>". Lines
+# without the "MT " prefix (prompts, warnings) are ignored.
+SESSION_SETUP = (
+    "function Sample($seq) { try { "
+    "$os = Get-CimInstance Win32_OperatingSystem; "
+    "$mem = [math]::Round($os.FreePhysicalMemory / 1KB); "
+    "$total = [math]::Round($os.TotalVisibleMemorySize / 1KB); "
+    "$disk = [math]::Round((Get-PSDrive C).Free / 1GB, 2); "
+    "$cpu = [math]::Round((Get-CimInstance Win32_Processor | Measure-Object -Property LoadPercentage -Average).Average); "
+    "[Console]::Out.WriteLine(\"MT $seq $mem $total $disk $cpu\") "
+    "} catch { [Console]::Out.WriteLine(\"MT $seq ERR $($_.Exception.Message)\") }; "
+    "[Console]::Out.Flush() }\n"
+)
+
+
+class PowerShellSession:
+    """
+    One long-lived PowerShell process on a channel of a pooled transport,
+    answering repeated sampling requests without a new process start-up.
+    """
+
+    def __init__(self, transport: paramiko.Transport, timeout: float):
+        self.transport = transport
+        self.channel = transport.open_session(timeout=timeout)
+        self.channel.settimeout(timeout)
+        self.channel.exec_command(SESSION_COMMAND)
+        self.stdout = self.channel.makefile("rb")
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.channel.sendall(SESSION_SETUP.encode())
+
+    def alive(self) -> bool:
+        """
+        Tell whether the remote process and its transport are still up.
+        """
+        return self.transport.is_active() and not self.channel.closed and not self.channel.exit_status_ready()
+
+    def sample(self):
+        """
+        Request one sample and return its fields.
+        """
+        with self.lock:
+            self.sequence += 1
+            prefix = f"MT {self.sequence} "
+            self.channel.sendall(f"Sample {self.sequence}\n".encode())
+            while True:
+                line = self.stdout.readline()
+                if not line:
+                    raise EOFError("PowerShell session is closed")
+                line = line.decode(errors="replace").strip()
+                if line.startswith(prefix):
+                    fields = line[len(prefix):].split()
+                    if fields and fields[0] == "ERR":
+                        raise RuntimeError(" ".join(fields[1:]))
+                    return fields
+
+    def close(self) -> None:
+        """
+        Stop the remote process by closing the channel.
+        """
+        self.channel.close()
+
+
+class PowerShellSessions:
+    """
+    Worker-level registry of PowerShell sessions keyed by (host, user), each
+    living on the transport of the SSH pool.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def session(self, host, username, password, timeout: float) -> PowerShellSession:
+        """
+        Return the live session of the server, starting one when needed.
+        Taking the transport from the pool every time keeps it from being
+        evicted as idle while its session is in use.
+        """
+        key = (host, username)
+        transport = self.pool.get(host, username, password)
+        with self.lock:
+            for stale_key in [k for k, session in self.sessions.items() if not session.alive()]:
+                self.sessions.pop(stale_key).close()
+            session = self.sessions.get(key)
+        if session is None or session.transport is not transport:
+            if session is not None:
+                session.close()
+            session = PowerShellSession(transport, timeout)
+            logger.info(f"PowerShell session on {username}@{host} is started")
+            with self.lock:
+                self.sessions[key] = session
+        return session
+
+    def discard(self, host, username) -> None:
+        """
+        Drop and close the session of the server.
+        """
+        with self.lock:
+            session = self.sessions.pop((host, username), None)
+        if session:
+            session.close()
+
+    def sample(self, host, username, password, timeout: float = 30):
+        """
+        Return the free memory, total memory, free disk and CPU load fields
+        of the server. A broken session is restarted once, on a fresh
+        transport.
+        """
+        for attempt in range(2):
+            try:
+                with self.pool.borrow(host, username, password):
+                    return self.session(host, username, password, timeout).sample()
+            except (paramiko.SSHException, EOFError, OSError):
+                self.discard(host, username)
+                self.pool.discard(host, username)
+                if attempt:
+                    raise
+
+
+sessions = PowerShellSessions(pool)
@@ -0,0 +1,113 @@
+import re
+
+# One remote exec printing only the /proc lines and statvfs data we need,
+# each block introduced by an "@<section>" marker line.
+PROBE_COMMAND = (
+    "echo @uptime; cat /proc/uptime; "
+    "echo @meminfo; grep -E '^(MemTotal|MemFree|MemAvailable):' /proc/meminfo; "
+    "echo @stat; grep '^cpu' /proc/stat; "
+    "echo @loadavg; cat /proc/loadavg; "
+    "echo @net; tail -n +3 /proc/net/dev; "
+    "echo @disk; awk '{print $3, $6, $10}' /proc/diskstats; "
+    "echo @df; df -Pk 2>/dev/null"
+)
+
+PSEUDO_FILESYSTEMS = {"tmpfs", "devtmpfs", "overlay", "squashfs", "udev", "none", "shm", "efivarfs"}
+
+PARTITION = re.compile(r"^((sd|hd|vd|xvd)[a-z]+\d+|(nvme\d+n\d+|mmcblk\d+)p\d+)$")
+
+SECTOR = 512
+
+
+def sections(output: str):
+    """
+    Split the probe output into its marked sections.
+    """
+    result, current = {}, None
+    for line in output.splitlines():
+        if line.startswith("@"):
+            current = result.setdefault(line[1:].strip(), [])
+        elif current is not None and line.strip():
+            current.append(line)
+    return result
+
+
+def parse(output: str):
+    """
+    Parse the probe output into gauges and the raw counters rates are
+    computed from.
+    """
+    data = sections(output)
+    meminfo = {line.split(":")[0]: int(line.split()[1]) for line in data.get("meminfo", [])}
+
+    cpus = {}
+    for line in data.get("stat", []):
+        name, *values = line.split()
+        values = [int(value) for value in values[:8]]
+        cpus[name] = [sum(values), values[3] + values[4]]
+
+    rx = tx = 0
+    for line in data.get("net", []):
+        interface, values = line.split(":", 1)
+        if interface.strip() != "lo":
+            values = values.split()
+            rx += int(values[0])
+            tx += int(values[8])
+
+    read = written = 0
+    for line in data.get("disk", []):
+        name, sectors_read, sectors_written = line.split()
+        if not name.startswith(("loop", "ram", "dm-", "zram")) and not PARTITION.match(name):
+            read += int(sectors_read)
+            written += int(sectors_written)
+
+    mounts = {}
+    for line in data.get("df", [])[1:]:
+        filesystem, size, _, available, _, mount = line.split(None, 5)
+        if filesystem not in PSEUDO_FILESYSTEMS and int(size):
+            mounts[mount] = (int(size), int(available))
+
+    root = mounts.get("/", (0, 0))
+    gauges = {
+        "free_memory": meminfo.get("MemFree", 0) // 1024,
+        "available_memory": meminfo.get("MemAvailable", 0) // 1024,
+        "total_memory": meminfo.get("MemTotal", 0) // 1024,
+        "free_disk": root[1] // 1024 ** 2,
+        "disk_used_pct_max": round(max(
+            (100 * (size - available) / size for size, available in mounts.values()), default=0), 1),
+        "cpu_load": data["loadavg"][0].split()[0] if data.get("loadavg") else "",
+    }
+    counters = {
+        "uptime": float(data["uptime"][0].split()[0]) if data.get("uptime") else 0.0,
+        "cpus": cpus,
+        "net": [rx, tx],
+        "disk": [read * SECTOR, written * SECTOR],
+    }
+    return gauges, counters
+
+
+def rates(previous, current):
+    """
+    Derive per-core CPU usage, network and disk I/O rates from two counter
+    snapshots of the same host.
+    """
+    if not previous or current["uptime"] <= previous["uptime"]:
+        return {}
+    elapsed = current["uptime"] - previous["uptime"]
+
+    usage = {}
+    for name, (total, idle) in current["cpus"].items():
+        if name in previous["cpus"]:
+            delta_total = total - previous["cpus"][name][0]
+            delta_idle = idle - previous["cpus"][name][1]
+            usage[name] = round(100 * (1 - delta_idle / delta_total), 1) if delta_total > 0 else 0.0
+    cores = [usage[name] for name in sorted((name for name in usage if name != "cpu"), key=lambda n: int(n[3:]))]
+
+    return {
+        "cpu_pct": usage.get("cpu", 0.0),
+        "cpu_cores_pct": ",".join(str(value) for value in cores),
+        "net_rx_bps": round(max(0, current["net"][0] - previous["net"][0]) / elapsed),
+        "net_tx_bps": round(max(0, current["net"][1] - previous["net"][1]) / elapsed),
+        "disk_read_bps": round(max(0, current["disk"][0] - previous["disk"][0]) / elapsed),
+        "disk_write_bps": round(max(0, current["disk"][1] - previous["disk"][1]) / elapsed),
+    }
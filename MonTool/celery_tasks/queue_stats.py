@@ -0,0 +1,71 @@
+import time
+
+import redis
+
+LATENCY_KEY = "celery:latency:{}"
+LATENCY_SAMPLES = 100
+
+# Queues are declared with these priority steps; every non-zero step is
+# kept in its own Redis list named "<queue><sep><step>".
+PRIORITY_STEPS = [0, 3, 6, 9]
+PRIORITY_SEP = ":"
+
+
+def mark_published(headers) -> None:
+    """
+    Stamp an outgoing task message with its publish time.
+    """
+    headers.setdefault("published_at", time.time())
+
+
+def record_latency(r, request) -> None:
+    """
+    Record how long a task waited in its queue before a worker started it.
+    """
+    published_at = request.get("published_at")
+    queue = (request.delivery_info or {}).get("routing_key")
+    if not published_at or not queue:
+        return
+    key = LATENCY_KEY.format(queue)
+    pipe = r.pipeline(transaction=False)
+    pipe.lpush(key, round(time.time() - float(published_at), 3))
+    pipe.ltrim(key, 0, LATENCY_SAMPLES - 1)
+    pipe.execute()
+
+
+def queue_stats(r, broker, queues):
+    """
+    Return the depth and the queue latency (last, average, p95 and max of
+    the recent tasks, in seconds) of every queue.
+    """
+    pipe = broker.pipeline(transaction=False)
+    for queue in queues:
+        for step in PRIORITY_STEPS:
+            pipe.llen(f"{queue}{PRIORITY_SEP}{step}" if step else queue)
+    depths = pipe.execute()
+
+    pipe = r.pipeline(transaction=False)
+    for queue in queues:
+        pipe.lrange(LATENCY_KEY.format(queue), 0, -1)
+    latencies = pipe.execute()
+
+    stats = {}
+    for index, queue in enumerate(queues):
+        samples = [float(sample) for sample in latencies[index]]
+        ordered = sorted(samples)
+        step_count = len(PRIORITY_STEPS)
+        stats[queue] = {
+            "depth": sum(depths[index * step_count:(index + 1) * step_count]),
+            "latency_last": samples[0] if samples else None,
+            "latency_avg": round(sum(samples) / len(samples), 3) if samples else None,
+            "latency_p95": ordered[int(0.95 * (len(ordered) - 1))] if ordered else None,
+            "latency_max": ordered[-1] if ordered else None,
+        }
+    return stats
+
+
+def broker_client(url: str) -> redis.Redis:
+    """
+    Return a client of the Redis database used as the Celery broker.
+    """
+    return redis.Redis.from_url(url, decode_responses=True)
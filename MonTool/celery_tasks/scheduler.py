@@ -0,0 +1,134 @@
+import logging
+import os
+import random
+import time
+from logging.config import dictConfig
+
+import redis
+from celery.utils import uuid
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MonTool.settings')
+
+from django.conf import settings
+
+SCHEDULE_KEY = "monitoring:schedule"
+COLLECTORS_KEY = "monitoring:collectors"
+LEASE_KEY = "monitoring:leases:"
+FLEET_KEY = "monitoring:fleet"
+
+# Atomically take the servers that are due and push them one interval ahead,
+# so concurrent schedulers never dispatch the same collection twice. Servers
+# whose viewer leases have all expired are dropped from the schedule instead.
+POP_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[3])
+local result = {}
+for i = 1, #due, 2 do
+    local leases = ARGV[4] .. due[i]
+    redis.call('ZREMRANGEBYSCORE', leases, '-inf', ARGV[1])
+    if redis.call('ZCARD', leases) == 0 then
+        redis.call('ZREM', KEYS[1], due[i])
+        redis.call('HDEL', KEYS[2], due[i])
+    else
+        redis.call('ZADD', KEYS[1], tonumber(ARGV[1]) + tonumber(ARGV[2]), due[i])
+        table.insert(result, due[i])
+        table.insert(result, due[i + 1])
+    end
+end
+return result
+"""
+
+# Take the due servers of the fleet-wide schedule and push them one interval
+# ahead; unlike POP_DUE every server stays scheduled, viewed or not.
+POP_FLEET_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[3])
+for i = 1, #due, 2 do
+    redis.call('ZADD', KEYS[1], tonumber(ARGV[1]) + tonumber(ARGV[2]), due[i])
+end
+return due
+"""
+
+logger = logging.getLogger("celery")
+
+
+def schedule(r, server_id) -> None:
+    """
+    Start collecting stats of the server, right away if it is not scheduled yet.
+    """
+    r.zadd(SCHEDULE_KEY, {server_id: time.time()}, nx=True)
+
+
+def pop_due(r, interval: float, limit: int = 1000):
+    """
+    Return (server id, due time) of up to `limit` due servers that still have
+    viewers and reschedule each of them one interval from now.
+    """
+    due = r.eval(POP_DUE, 2, SCHEDULE_KEY, COLLECTORS_KEY, time.time(), interval, limit, LEASE_KEY)
+    return [(int(due[i]), float(due[i + 1])) for i in range(0, len(due), 2)]
+
+
+def pop_fleet_due(r, interval: float, limit: int = 1000):
+    """
+    Return (server id, due time) of up to `limit` due servers of the
+    fleet-wide schedule and reschedule each of them one interval from now.
+    """
+    due = r.eval(POP_FLEET_DUE, 1, FLEET_KEY, time.time(), interval, limit)
+    return [(int(due[i]), float(due[i + 1])) for i in range(0, len(due), 2)]
+
+
+def reconcile_fleet(r, server_ids, interval: float):
+    """
+    Make the fleet-wide schedule hold exactly the given servers. New ones are
+    spread over the next interval so they don't all fall due at once.
+    Returns the number of servers added and removed.
+    """
+    scheduled = {int(member) for member in r.zrange(FLEET_KEY, 0, -1)}
+    wanted = set(server_ids)
+    added, removed = wanted - scheduled, scheduled - wanted
+    now = time.time()
+    pipe = r.pipeline(transaction=False)
+    if added:
+        pipe.zadd(FLEET_KEY, {server_id: now + random.uniform(0, interval) for server_id in added}, nx=True)
+    if removed:
+        pipe.zrem(FLEET_KEY, *removed)
+    pipe.execute()
+    return len(added), len(removed)
+
+
+def seconds_until_next(r, cap: float, key: str = SCHEDULE_KEY) -> float:
+    """
+    Return how long to wait for the next due server of a schedule, at most
+    `cap` seconds.
+    """
+    head = r.zrange(key, 0, 0, withscores=True)
+    if not head:
+        return cap
+    return min(cap, max(0.0, head[0][1] - time.time()))
+
+
+def run(r) -> None:
+    """
+    Dispatch a short 'server_stats' job for every server when it becomes due,
+    recording its task id as the only collector allowed to run for the server.
+    """
+    from celery_tasks.celery import app
+
+    while True:
+        try:
+            due = pop_due(r, settings.MONITORING_INTERVAL)
+            if due:
+                task_ids = {server_id: uuid() for server_id, _ in due}
+                r.hset(COLLECTORS_KEY, mapping=task_ids)
+                for server_id, task_id in task_ids.items():
+                    app.send_task("celery_tasks.tasks.server_stats", args=[server_id], task_id=task_id,
+                                  expires=settings.MONITORING_INTERVAL)
+                logger.info(f"Scheduler dispatched {len(due)} collection(s)")
+            time.sleep(seconds_until_next(r, 1.0))
+        except Exception as error:
+            logger.error(f"Error within monitoring scheduler - {error}")
+            time.sleep(1)
+
+
+if __name__ == "__main__":
+    dictConfig(settings.LOGGING)
+    logger.info("Monitoring scheduler is running...")
+    run(redis.Redis(host='redis', port=6379, db=1, decode_responses=True))
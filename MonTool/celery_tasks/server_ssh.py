@@ -1,19 +1,162 @@
+import socket
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
 import paramiko
 import logging
-from queue import Queue
 
 import os
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MonTool.settings')
 
+from django.conf import settings
+
 logger = logging.getLogger("celery")
 
 
-def get_conn(host, username, password):
+class TransportPool:
     """
-    Establish connection to the server over SSH
+    Worker-level LRU pool of authenticated SSH transports keyed by (host, user).
+
+    Transports are kept alive between collections, so a collection only opens
+    a new channel instead of redoing the TCP, key exchange and auth handshake.
     """
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(host, username=username, password=password)
-    return ssh
+
+    def __init__(self, max_size: int, idle_timeout: float, keepalive: int,
+                 connect_timeout: float = 5, banner_timeout: float = 10, auth_timeout: float = 10):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.banner_timeout = banner_timeout
+        self.auth_timeout = auth_timeout
+        self.transports = OrderedDict()
+        self.lock = threading.Lock()
+        # One lock per server, held while connecting to it; kept for the
+        # lifetime of the pool as there is one small lock per known server.
+        self.connecting = {}
+        self.borrowed = Counter()
+
+    def connect(self, host, username, password) -> paramiko.Transport:
+        """
+        Establish and authenticate a new transport to the server, bounding
+        the TCP connect, the SSH banner and key exchange, and the auth steps.
+        """
+        sock = socket.create_connection((host, 22), timeout=self.connect_timeout)
+        transport = paramiko.Transport(sock)
+        transport.banner_timeout = self.banner_timeout
+        transport.auth_timeout = self.auth_timeout
+        try:
+            transport.start_client(timeout=self.banner_timeout)
+            transport.auth_password(username, password)
+        except Exception:
+            transport.close()
+            raise
+        transport.set_keepalive(self.keepalive)
+        logger.info(f"SSH transport to {username}@{host} is opened")
+        return transport
+
+    @staticmethod
+    def healthy(transport: paramiko.Transport) -> bool:
+        """
+        Tell whether the transport can still open channels.
+        """
+        return transport.is_active() and transport.is_authenticated()
+
+    def evict(self) -> None:
+        """
+        Close transports that are idle for too long or exceed the size bound,
+        never the ones borrowed by a running command. Must be called with the
+        lock held.
+        """
+        now = time.monotonic()
+        for key, (transport, last_used) in list(self.transports.items()):
+            if key in self.borrowed:
+                continue
+            if now - last_used > self.idle_timeout or not self.healthy(transport):
+                del self.transports[key]
+                transport.close()
+        for key in list(self.transports):
+            if len(self.transports) <= self.max_size:
+                break
+            if key not in self.borrowed:
+                self.transports.pop(key)[0].close()
+
+    def get(self, host, username, password) -> paramiko.Transport:
+        """
+        Return a healthy pooled transport, connecting only when there is none.
+        Connections are made under a per-server lock, so threads asking for
+        the same server at once share one transport instead of racing.
+        """
+        key = (host, username)
+        with self.lock:
+            self.evict()
+            connecting = self.connecting.setdefault(key, threading.Lock())
+        with connecting:
+            with self.lock:
+                entry = self.transports.get(key)
+                if entry and self.healthy(entry[0]):
+                    self.transports[key] = (entry[0], time.monotonic())
+                    self.transports.move_to_end(key)
+                    return entry[0]
+            transport = self.connect(host, username, password)
+            with self.lock:
+                entry = self.transports.pop(key, None)
+                self.transports[key] = (transport, time.monotonic())
+                self.evict()
+        if entry:
+            entry[0].close()
+        return transport
+
+    @contextmanager
+    def borrow(self, host, username, password):
+        """
+        Yield the pooled transport of the server, keeping it from eviction
+        until the block exits.
+        """
+        key = (host, username)
+        with self.lock:
+            self.borrowed[key] += 1
+        try:
+            yield self.get(host, username, password)
+        finally:
+            with self.lock:
+                self.borrowed[key] -= 1
+                if not self.borrowed[key]:
+                    del self.borrowed[key]
+
+    def discard(self, host, username) -> None:
+        """
+        Drop and close the pooled transport of the server.
+        """
+        with self.lock:
+            entry = self.transports.pop((host, username), None)
+        if entry:
+            entry[0].close()
+
+    def run(self, host, username, password, command: str, timeout: float = 30) -> str:
+        """
+        Run a command on a new channel of the pooled transport and return its
+        output. A transport that fails to open a channel is replaced once.
+        """
+        for attempt in range(2):
+            with self.borrow(host, username, password) as transport:
+                try:
+                    channel = transport.open_session(timeout=timeout)
+                except (paramiko.SSHException, EOFError, OSError):
+                    self.discard(host, username)
+                    if attempt:
+                        raise
+                    continue
+                with channel:
+                    channel.settimeout(timeout)
+                    channel.exec_command(command)
+                    return channel.makefile("rb").read().decode().strip()
+
+# Never smaller than the number of collections in flight, or the pool would
+# reconnect to the same servers on every cycle.
+pool = TransportPool(max(settings.SSH_POOL_SIZE, settings.COLLECTOR_CONCURRENCY),
+                     settings.SSH_IDLE_TIMEOUT, settings.SSH_KEEPALIVE, settings.SSH_CONNECT_TIMEOUT,
+                     settings.SSH_BANNER_TIMEOUT, settings.SSH_AUTH_TIMEOUT)
@@ -1,3 +1,3 @@
 #!/bin/bash
 
-celery -A celery_tasks.celery worker -l INFO
\ No newline at end of file
+celery -A celery_tasks.celery worker -l INFO "$@"
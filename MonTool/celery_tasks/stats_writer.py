@@ -0,0 +1,130 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from celery_tasks.warehouse import INGEST_KEY, sample_lines
+
+logger = logging.getLogger("celery")
+
+
+def stats_channel(server_id) -> str:
+    """
+    Return the pub/sub channel the stats of a server are published on.
+    """
+    return f"server:{server_id}:stats"
+
+
+def write_samples(r, history, samples) -> None:
+    """
+    Write (server id, timestamp, stats) samples of any number of servers in
+    one pipeline: the latest stats hash of every server, its history ring
+    buffers, the warehouse ingestion queue and a publish of the latest stats
+    on the server's channel. `r` must be a binary client, as the history
+    buffers are binary.
+    """
+    by_server = defaultdict(list)
+    for server_id, ts, stats in samples:
+        by_server[server_id].append((ts, stats))
+
+    pipe = r.pipeline(transaction=False)
+    blocks = {}
+    lines = []
+    for server_id, server_samples in by_server.items():
+        server_samples.sort(key=lambda sample: sample[0])
+        ts, latest = server_samples[-1]
+        r_key = f"server:{server_id}"
+        if latest:
+            pipe.hset(r_key, mapping=latest)
+            pipe.expire(r_key, 3600)
+        pipe.publish(stats_channel(server_id), json.dumps({"ts": ts, **latest}, default=str))
+        blocks[server_id] = history.queue(pipe, server_id, server_samples)
+        for sample_ts, stats in server_samples:
+            lines.extend(sample_lines(server_id, sample_ts, stats))
+    if lines:
+        pipe.rpush(INGEST_KEY, *lines)
+    results = pipe.execute()
+
+    for server_id, (block, index) in blocks.items():
+        history.seal_completed(r, server_id, results[index], block)
+
+
+class StatsWriter:
+    """
+    Process-wide buffer of collected samples, flushed through `write_samples`
+    once `max_batch` samples are waiting or every `interval` seconds, so the
+    Redis writes of many servers share a round trip. A batch that fails to
+    be written is put back, keeping at most `max_pending` samples; the
+    oldest ones beyond that are dropped and counted.
+    """
+
+    def __init__(self, r, history, max_batch: int, interval: float, max_pending: int = None):
+        self.r = r
+        self.history = history
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_pending = max_pending or 10 * max_batch
+        self.buffer = []
+        self.dropped = 0
+        self.failed_at = 0.0
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def start(self) -> None:
+        """
+        Start the periodic flusher of this process; a forked worker process
+        starts its own on first use. Must be called with the lock held.
+        """
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.buffer = []
+        threading.Thread(target=self.loop, name="stats-writer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def add(self, server_id, ts: float, stats) -> None:
+        """
+        Buffer one sample, flushing right away when the batch is full. After
+        a failed write the next attempt is left to the periodic flusher.
+        """
+        with self.lock:
+            self.start()
+            self.buffer.append((server_id, ts, stats))
+            full = len(self.buffer) >= self.max_batch and time.monotonic() - self.failed_at >= self.interval
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write every buffered sample, putting the batch back when it fails.
+        """
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+        if not batch:
+            return
+        try:
+            write_samples(self.r, self.history, batch)
+        except Exception:
+            with self.lock:
+                self.failed_at = time.monotonic()
+                self.buffer = batch + self.buffer
+                excess = len(self.buffer) - self.max_pending
+                if excess > 0:
+                    del self.buffer[:excess]
+                    self.dropped += excess
+                    logger.error(f"{excess} buffered stats samples are dropped, {self.dropped} in total")
+            raise
+
+    def loop(self) -> None:
+        """
+        Flush the buffer periodically.
+        """
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as error:
+                logger.error(f"Error during stats flush - {error}")
@@ -0,0 +1,83 @@
+import logging
+
+logger = logging.getLogger("celery")
+
+OFFLINE = "❌Offline"
+
+STATE_KEY = "ping_state"
+
+
+class StatusMachine:
+    """
+    Per-server availability state machine with hysteresis.
+
+    A server only goes down after `down_after` consecutive failed pings and
+    only comes back up after `up_after` consecutive answered ones. The state
+    of every server is kept in the `ping_state` Redis hash as
+    "<up|down>:<consecutive failures>:<consecutive successes>".
+    """
+
+    def __init__(self, r, down_after: int, up_after: int):
+        self.r = r
+        self.down_after = down_after
+        self.up_after = up_after
+
+    def load(self, server_ids):
+        """
+        Read the stored state of the given servers in one round trip.
+        """
+        if not server_ids:
+            return {}
+        values = self.r.hmget(STATE_KEY, server_ids)
+        states = {}
+        for server_id, value in zip(server_ids, values):
+            if value:
+                state, fails, oks = value.split(":")
+                states[server_id] = [state, int(fails), int(oks)]
+        return states
+
+    def save(self, states) -> None:
+        """
+        Replace the stored states atomically, dropping servers that are gone.
+        """
+        pipe = self.r.pipeline()
+        pipe.delete(STATE_KEY)
+        if states:
+            pipe.hset(STATE_KEY, mapping={
+                server_id: f"{state}:{fails}:{oks}" for server_id, (state, fails, oks) in states.items()
+            })
+        pipe.execute()
+
+    def advance(self, observations):
+        """
+        Feed one sweep of observations into the state machine.
+
+        `observations` maps server id -> (observed status, stored status).
+        Returns the statuses that must be written to the database and the ids
+        of servers that have just gone down.
+        """
+        states = self.load(list(observations))
+        changes, went_down = {}, []
+        for server_id, (observed, stored) in observations.items():
+            state, fails, oks = states.get(server_id) or ["down" if stored == OFFLINE else "up", 0, 0]
+            if observed == OFFLINE:
+                fails, oks = fails + 1, 0
+                if state == "up" and fails >= self.down_after:
+                    state = "down"
+                    went_down.append(server_id)
+            else:
+                fails, oks = 0, oks + 1
+                if state == "down" and oks >= self.up_after:
+                    state = "up"
+            states[server_id] = [state, fails, oks]
+
+            if state == "down":
+                status = OFFLINE
+            elif observed == OFFLINE:
+                status = stored
+            else:
+                status = observed
+            if status != stored:
+                changes[server_id] = status
+        self.save({server_id: states[server_id] for server_id in observations})
+        return changes, went_down
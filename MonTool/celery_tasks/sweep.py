@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import socket
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from ping3 import ping
+
+logger = logging.getLogger("celery")
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+
+def checksum(data: bytes) -> int:
+    """
+    Compute the RFC 1071 internet checksum of an ICMP packet.
+    """
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def echo_request(ident: int, seq: int) -> bytes:
+    """
+    Build an ICMP echo request packet with the given identifier and sequence.
+    """
+    payload = b"montool-sweep"
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum(header + payload), ident, seq) + payload
+
+
+class IcmpSweeper:
+    """
+    Multiplex ICMP echo probes for many hosts over a single socket.
+
+    Requests are matched to replies by (source ip, sequence), so every probe
+    only waits for its own deadline instead of blocking the ones behind it.
+    """
+
+    def __init__(self, sock: socket.socket, timeout: float, concurrency: int):
+        self.sock = sock
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.raw = sock.type == socket.SOCK_RAW
+        self.ident = os.getpid() & 0xFFFF
+        self.seq = 0
+        self.pending = {}
+
+    @staticmethod
+    def open_socket() -> socket.socket:
+        """
+        Open an unprivileged datagram ICMP socket, falling back to a raw one.
+        """
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        except PermissionError:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        sock.setblocking(False)
+        return sock
+
+    def on_readable(self) -> None:
+        """
+        Drain every pending datagram and resolve the matching probe futures.
+        """
+        received = time.perf_counter()
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            offset = (data[0] & 0x0F) * 4 if self.raw else 0
+            if len(data) < offset + 8:
+                continue
+            icmp_type, _, _, ident, seq = struct.unpack("!BBHHH", data[offset:offset + 8])
+            if icmp_type != ICMP_ECHO_REPLY or (self.raw and ident != self.ident):
+                continue
+            future = self.pending.get((addr[0], seq))
+            if future and not future.done():
+                future.set_result(received)
+
+    async def probe(self, ip: str):
+        """
+        Send one echo request and return the round trip in milliseconds, or None.
+        """
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            self.seq = (self.seq + 1) & 0xFFFF
+            key = (ip, self.seq)
+            future = loop.create_future()
+            self.pending[key] = future
+            try:
+                sent = time.perf_counter()
+                await loop.sock_sendto(self.sock, echo_request(self.ident, self.seq), (ip, 0))
+                received = await asyncio.wait_for(future, self.timeout)
+                return (received - sent) * 1000
+            except (asyncio.TimeoutError, OSError):
+                return None
+            finally:
+                self.pending.pop(key, None)
+
+    async def run(self, targets):
+        """
+        Probe all targets concurrently and map each key to its round trip.
+        """
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.sock.fileno(), self.on_readable)
+        try:
+            keys = [key for key, _ in targets]
+            rtts = await asyncio.gather(*(self.probe(ip) for _, ip in targets))
+            return dict(zip(keys, rtts))
+        finally:
+            loop.remove_reader(self.sock.fileno())
+
+
+async def ping3_sweep(targets, timeout: float, concurrency: int):
+    """
+    Fallback sweep running blocking ping3 probes on a bounded thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, partial(ping, ip, timeout=timeout)) for _, ip in targets
+        ))
+    return {key: res * 1000 if res else None for (key, _), res in zip(targets, results)}
+
+
+async def async_sweep(targets, timeout: float, concurrency: int):
+    """
+    Run a sweep over the multiplexed ICMP socket, or over ping3 if no ICMP
+    socket can be opened in this environment.
+    """
+    try:
+        sock = IcmpSweeper.open_socket()
+    except OSError as error:
+        logger.warning(f"ICMP socket is unavailable, falling back to ping3 - {error}")
+        return await ping3_sweep(targets, timeout, min(concurrency, 64))
+    with sock:
+        return await IcmpSweeper(sock, timeout, concurrency).run(targets)
+
+
+def sweep(targets, timeout: float = 4, concurrency: int = 256):
+    """
+    Ping every (key, ip) target concurrently with a per-probe deadline.
+
+    Returns a dict of key -> round trip in milliseconds (None if the host did
+    not answer in time) and the wall-clock duration of the sweep in seconds.
+    """
+    targets = list(targets)
+    started = time.perf_counter()
+    rtts = asyncio.run(async_sweep(targets, timeout, concurrency)) if targets else {}
+    return rtts, time.perf_counter() - started
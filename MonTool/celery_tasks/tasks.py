@@ -1,137 +1,280 @@
-import asyncio
+import json
 import os
 import time
 import logging
+from collections import defaultdict
 
-import redis
+import paramiko
 from celery import shared_task
+from celery.signals import worker_process_shutdown
 from cryptography.fernet import Fernet
-from ping3 import ping
-from telegram.error import NetworkError
+from django.conf import settings
+from django.db import transaction
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MonTool.settings')
 
+from app.fragments import bump_servers_version
 from app.models import Server, MonUser
-from telegram import Bot
-from telegram.constants import ParseMode
 
-from celery_tasks.server_ssh import get_conn
+from celery_tasks import breaker
+from celery_tasks.connections import r, rb
+from celery_tasks.history import History
+from celery_tasks.leases import is_collector
+from celery_tasks.local_cache import LocalCache
+from celery_tasks.notifier import enqueue
+from celery_tasks.powershell import sessions as powershell
+from celery_tasks.probe import PROBE_COMMAND, parse, rates
+from celery_tasks.server_ssh import pool
+from celery_tasks.stats_writer import StatsWriter
+from celery_tasks.status_machine import StatusMachine, OFFLINE, STATE_KEY
+from celery_tasks.sweep import sweep
+from celery_tasks.warehouse import INGEST_KEY, take_batch, copy_samples, ensure_partitions, rollup, expire_rollups
 
 EXCEPTIONS = False
 
-TOKEN = os.getenv("TOKEN")
 fernet = Fernet(os.getenv("ENCRYPTION_KEY").encode())
 
-bot = Bot(token=TOKEN)
+logger = logging.getLogger("celery")
 
-r = redis.Redis(host='redis', port=6379, db=1, decode_responses=True)
+owner_tg_ids = LocalCache("owners", ttl=settings.OWNER_CACHE_TTL)
+server_credentials = LocalCache("servers", ttl=settings.CREDENTIAL_CACHE_TTL)
 
-logger = logging.getLogger("celery")
+history = History.from_settings(settings)
 
+writer = StatsWriter(rb, history, settings.STATS_FLUSH_BATCH, settings.STATS_FLUSH_INTERVAL)
 
-async def tg_notification(ip, tg_id):
+
+@worker_process_shutdown.connect
+def flush_stats(**kwargs) -> None:
     """
-    Send a Telegram notification about a server being down.
+    Flush the buffered stats of a prefork child, which exits without running
+    atexit handlers.
     """
     try:
-        await bot.send_message(
-            chat_id=tg_id,
-            text=f"The server with IP '{ip}' is down! Check immediately!!!'",
-            parse_mode=ParseMode.HTML,
-        )
-        logger.info("Tg notification is sent")
-    except (RuntimeError, NetworkError) as error:
-        logger.error(f"Error during tg notification delivery - {error}")
+        writer.flush()
+    except Exception as error:
+        logger.error(f"Error during stats flush - {error}")
+
+
+def ping_status(rtt):
+    """
+    Map a ping round trip in milliseconds to a connection quality status.
+    """
+    if rtt is None:
+        return OFFLINE
+    if rtt <= 30:
+        return "🌟Excellent"
+    if rtt <= 100:
+        return "✅Good"
+    return "⚠️Poor"
+
+
+def write_statuses(changes, chunk_size=1000) -> None:
+    """
+    Persist changed statuses with one UPDATE per status value and chunk of ids.
+    """
+    ids_by_status = defaultdict(list)
+    for server_id, status in changes.items():
+        ids_by_status[status].append(server_id)
+    with transaction.atomic():
+        for status, ids in ids_by_status.items():
+            for start in range(0, len(ids), chunk_size):
+                Server.objects.filter(id__in=ids[start:start + chunk_size]).update(status=status)
+
+
+def resolve_tg_ids(owner_ids):
+    """
+    Map owner ids to Telegram ids through the worker-local cache, loading all
+    cache misses in a single query.
+    """
+    owner_tg_ids.sync(r)
+    tg_ids = owner_tg_ids.get_many(owner_ids)
+    missing = set(owner_ids) - tg_ids.keys()
+    if missing:
+        loaded = dict(MonUser.objects.filter(id__in=missing).values_list('id', 'tg_id'))
+        owner_tg_ids.set_many(loaded)
+        tg_ids.update(loaded)
+    return tg_ids
 
 
 @shared_task
 def connection_quality() -> None:
     """
-    Ping all registered servers and update their connection quality
-    status in the database. Send Telegram alert if server is offline.
+    Ping all registered servers concurrently and update their connection
+    quality status in the database. Statuses only change once a server has
+    failed or answered enough consecutive pings, and a Telegram alert is sent
+    only when a server goes offline.
     """
-    server_ips = Server.objects.values_list('server_ip', 'id')
     try:
-        for record in server_ips:
-            ping_res = ping(record[0])
-            if ping_res:
-                ping_res *= 1000
-                if ping_res <= 30:
-                    Server.objects.filter(id=record[1]).update(status="🌟Excellent")
-                    logger.info(f"Server(ip: {record[0]}) status is updated to Excellent")
-                elif 100 <= ping_res > 30:
-                    Server.objects.filter(id=record[1]).update(status="✅Good")
-                    logger.info(f"Server(ip: {record[0]}) status is updated to Good")
-                elif 1000 <= ping_res > 100:
-                    Server.objects.filter(id=record[1]).update(status="⚠️Poor")
-                    logger.info(f"Server status(ip: {record[0]}) is updated to ️Poor")
-            else:
-                Server.objects.filter(id=record[1]).update(status="❌Offline")
-                logger.info(f"Server status(ip: {record[0]}) is updated to Offline")
-                user_email = Server.objects.get(id=record[1]).owner
-                tg_id = MonUser.objects.get(email=user_email).tg_id
-                if tg_id:
-                    asyncio.run(tg_notification(record[0], tg_id))
+        server_ips = list(Server.objects.values_list('server_ip', 'id', 'status', 'owner_id'))
+        rtts, duration = sweep(((record[1], record[0]) for record in server_ips),
+                               timeout=settings.PING_TIMEOUT, concurrency=settings.PING_CONCURRENCY)
+        logger.info(f"Ping sweep of {len(server_ips)} servers took {duration:.2f}s")
+        machine = StatusMachine(r, settings.PING_DOWN_THRESHOLD, settings.PING_UP_THRESHOLD)
+        changes, went_down = machine.advance({
+            record[1]: (ping_status(rtts.get(record[1])), record[2]) for record in server_ips
+        })
+        write_statuses(changes)
+        logger.info(f"{len(changes)} of {len(server_ips)} server statuses changed, {len(went_down)} went down")
+        servers = {record[1]: record for record in server_ips}
+        if changes:
+            bump_servers_version({servers[server_id][3] for server_id in changes})
+        tg_ids = resolve_tg_ids({servers[server_id][3] for server_id in went_down})
+        alerts = []
+        for server_id in went_down:
+            logger.info(f"Server(ip: {servers[server_id][0]}) went offline")
+            tg_id = tg_ids.get(servers[server_id][3])
+            if tg_id:
+                alerts.append((tg_id, f"The server with IP '{servers[server_id][0]}' is down! Check immediately!!!'"))
+        enqueue(r, alerts)
     except Exception as error:
         logger.error(f"Error within 'connection_quality' task execution - {error}")
 
 
-active_monitoring_tasks = {}
+def credentials(server_id):
+    """
+    Return the (ip, user, decrypted password, os) of a server from the
+    worker-local cache, loading and decrypting them only on a miss.
+    """
+    server_credentials.sync(r)
+    cached = server_credentials.get_many([server_id])
+    if server_id in cached:
+        return cached[server_id]
+    row = Server.objects.filter(id=server_id).values_list('server_ip', 'user_name', 'password', 'os_name').first()
+    if row is None:
+        return None
+    creds = (row[0], row[1], fernet.decrypt(row[2].encode()).decode(), row[3])
+    server_credentials.set_many({server_id: creds})
+    return creds
+
+
+def collect(server_id) -> None:
+    """
+    Collect memory, disk, and CPU stats from a specific server via SSH
+    and store the values in Redis. Supports Linux and Windows servers;
+    Linux servers also report per-core CPU, network and disk I/O rates.
+    Servers pushing through the MonTool agent, down by ping or behind an
+    open SSH circuit breaker are skipped.
+    """
+    pipe = r.pipeline(transaction=False)
+    pipe.exists(f"agent:{server_id}")
+    pipe.hget(STATE_KEY, server_id)
+    breaker.queue_state(pipe, server_id)
+    agent, ping_state, breaker_state = pipe.execute()
+    if agent:
+        logger.info(f"Server(id: {server_id}) reports through its agent, SSH collection is skipped")
+        return
+    if ping_state and ping_state.split(":")[0] == "down":
+        logger.info(f"Server(id: {server_id}) is down by ping, SSH collection is skipped")
+        return
+    if breaker.is_open(breaker_state):
+        logger.info(f"Circuit breaker of server(id: {server_id}) is open, SSH collection is skipped")
+        return
+    creds = credentials(server_id)
+    if creds is None:
+        logger.info(f"Server(id: {server_id}) no longer exists, collection is skipped")
+        return
+    password = creds[2]
+    logger.info(server_id)
+    try:
+        if creds[3] == 'Linux':
+            output = pool.run(creds[0], creds[1], password, PROBE_COMMAND)
+        elif creds[3] == 'Windows':
+            output = powershell.sample(creds[0], creds[1], password)
+        else:
+            return
+    except (paramiko.SSHException, EOFError, OSError) as error:
+        failures, backoff = breaker.record_failure(r, server_id, settings.SSH_BREAKER_BASE, settings.SSH_BREAKER_MAX)
+        logger.error(f"Server(id: {server_id}) is unreachable over SSH ({failures} in a row), "
+                     f"retrying in {backoff:.0f}s - {error}")
+        raise
+    if breaker_state[0]:
+        breaker.record_success(r, server_id)
+    if creds[3] == 'Linux':
+        gauges, counters = parse(output)
+        previous = r.set(f"probe:{server_id}", json.dumps(counters), ex=3600, get=True)
+        stats = {**gauges, **rates(json.loads(previous) if previous else None, counters)}
+    else:
+        free_mem, total_mem, disk_space, cpu_load = output
+        logger.info(f"{free_mem, disk_space, cpu_load}")
+        stats = {
+            'free_memory': free_mem,
+            'total_memory': total_mem,
+            'free_disk': disk_space,
+            'cpu_load': cpu_load
+        }
+    writer.add(server_id, time.time(), stats)
+    logger.info(f"The {creds[3]} server(id: {server_id}) stats are queued for saving to Redis")
 
 
 @shared_task(bind=True)
 def server_stats(self, server_id):
     """
-    Collect memory, disk, and CPU stats from a specific server via SSH
-    and store the values in Redis. Supports Linux and Windows servers.
+    Run one stats collection of a specific server. The monitoring scheduler
+    dispatches it when due and only its latest job for the server is allowed
+    to collect.
     """
     try:
-        if server_id in active_monitoring_tasks and active_monitoring_tasks[server_id] != self.request.id:
+        if not is_collector(r, server_id, self.request.id):
             return
+        collect(server_id)
+    except Exception as error:
+        logger.error(f"Error during 'server_stats' task execution -  {error}")
+
 
-        creds = Server.objects.filter(id=server_id).values_list('server_ip', 'user_name', 'password').first()
-        password = fernet.decrypt(creds[2].encode()).decode()
-        ssh = get_conn(creds[0], creds[1], password,)
+@shared_task
+def flush_metrics() -> None:
+    """
+    Drain the queued metric samples into Postgres with batched COPYs.
+    """
+    total = 0
+    while True:
+        lines = take_batch(r, settings.METRICS_FLUSH_BATCH)
+        if not lines:
+            break
         try:
-            logger.info(server_id)
-            if Server.objects.get(id=server_id).os_name == 'Linux':
-                stdin, stdout, stderr = ssh.exec_command(
-                    "echo $(free -m | awk '/^Mem:/ {print $4}') $(df -BG / | awk 'NR==2 {gsub(/G/, \"\", $4); print $4}') $(uptime | awk -F'load average:' '{print $2}' | cut -d',' -f1 | xargs)")
-                output = stdout.read().decode().strip()
-                free_mem, disk_space, cpu_load = output.split()
-                r_key = f"server:{server_id}"
-                r.hset(r_key, mapping={
-                    'free_memory': free_mem,
-                    'free_disk': disk_space,
-                    'cpu_load': cpu_load
-                })
-                logger.info(f"The Linux server(id: {server_id}) stats are saved to Redis")
-                r.expire(r_key, 3600)
-            elif Server.objects.get(id=server_id).os_name == 'Windows':
-                command = (
-                    'powershell -Command '
-                    '"$mem = [math]::Round((Get-WmiObject Win32_OperatingSystem).FreePhysicalMemory / 1KB); '
-                    '$disk = [math]::Round((Get-PSDrive C).Free / 1GB, 2); '
-                    '$cpu = (Get-CimInstance Win32_Processor | Measure-Object -Property LoadPercentage -Average).Average; '
-                    'Write-Output \\"$mem $disk $cpu\\""'
-                )
-                stdin, stdout, stderr= ssh.exec_command(command)
-                output = stdout.read().decode().strip()
-                free_mem, disk_space, cpu_load = output.split()
-                logger.info(f"{free_mem, disk_space, cpu_load}")
-                r_key = f"server:{server_id}"
-                r.hset(r_key, mapping={
-                    'free_memory': free_mem,
-                    'free_disk': disk_space,
-                    'cpu_load': cpu_load
-                })
-                logger.info(f"The Windows server(id: {server_id}) stats are saved to Redis")
-                r.expire(r_key, 3600)
-        finally:
-            ssh.close()
-        time.sleep(30)
-
-        if server_id in active_monitoring_tasks and active_monitoring_tasks[server_id] == self.request.id:
-            self.server_stats.delay(server_id)
+            copy_samples(lines)
+        except Exception as error:
+            r.lpush(INGEST_KEY, *reversed(lines))
+            logger.error(f"Error during 'flush_metrics' task execution - {error}")
+            break
+        total += len(lines)
+        if len(lines) < settings.METRICS_FLUSH_BATCH:
+            break
+    if total:
+        logger.info(f"{total} metric samples are flushed to Postgres")
+
+
+@shared_task
+def manage_metric_partitions() -> None:
+    """
+    Keep the daily sample partitions created ahead and expire the old ones.
+    """
+    try:
+        ensure_partitions(settings.METRICS_PARTITIONS_AHEAD, settings.METRICS_RAW_RETENTION)
     except Exception as error:
-        logger.error(f"Error during 'server_stats' task execution -  {error}")
+        logger.error(f"Error during 'manage_metric_partitions' task execution - {error}")
+
+
+@shared_task
+def expire_metric_rollups() -> None:
+    """
+    Delete the metric rollups older than the retention of their resolution.
+    """
+    try:
+        count = expire_rollups(settings.METRICS_ROLLUP_RETENTION)
+        logger.info(f"{count} expired metric rollup buckets are deleted")
+    except Exception as error:
+        logger.error(f"Error during 'expire_metric_rollups' task execution - {error}")
+
+
+@shared_task
+def rollup_metrics(resolution: str) -> None:
+    """
+    Refresh the recent buckets of one metric rollup resolution.
+    """
+    try:
+        count = rollup(resolution)
+        logger.info(f"{count} metric rollup buckets ({resolution}) are refreshed")
+    except Exception as error:
+        logger.error(f"Error during 'rollup_metrics' task execution - {error}")
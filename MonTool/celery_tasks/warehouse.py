@@ -0,0 +1,175 @@
+import io
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection, transaction
+
+from celery_tasks.history import METRICS
+
+INGEST_KEY = "metrics:ingest"
+
+RAW_AGGREGATES = "count(*), sum(value), min(value), max(value)"
+ROLLUP_AGGREGATES = "sum(count), sum(sum), min(min), max(max)"
+
+# Each resolution is aggregated from the next finer one: resolution ->
+# (source table, time column, aggregates, source resolution, bucket unit,
+# how far back to recompute so late samples are picked up).
+ROLLUPS = {
+    "1m": ("app_metricsample", "ts", RAW_AGGREGATES, None, "minute", timedelta(minutes=5)),
+    "1h": ("app_metricrollup", "bucket", ROLLUP_AGGREGATES, "1m", "hour", timedelta(hours=2)),
+    "1d": ("app_metricrollup", "bucket", ROLLUP_AGGREGATES, "1h", "day", timedelta(days=2)),
+}
+
+logger = logging.getLogger("celery")
+
+
+def sample_lines(server_id, ts: float, values):
+    """
+    Format one sample of every known metric as COPY text rows.
+    """
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S+00", time.gmtime(ts))
+    lines = []
+    for metric in METRICS:
+        try:
+            lines.append(f"{server_id}\t{metric}\t{stamp}\t{float(values[metric])!r}")
+        except (KeyError, TypeError, ValueError):
+            continue
+    return lines
+
+
+def take_batch(r, size: int):
+    """
+    Atomically pop up to `size` queued COPY rows.
+    """
+    pipe = r.pipeline()
+    pipe.lrange(INGEST_KEY, 0, size - 1)
+    pipe.ltrim(INGEST_KEY, size, -1)
+    return pipe.execute()[0]
+
+
+def copy_samples(lines) -> None:
+    """
+    Bulk load COPY text rows into the partitioned sample table.
+    """
+    buffer = io.StringIO("\n".join(lines) + "\n")
+    with connection.cursor() as cursor:
+        cursor.copy_expert("COPY app_metricsample (server_id, metric, ts, value) FROM STDIN", buffer)
+
+
+def create_partition(cursor, day) -> None:
+    """
+    Create the sample partition of one day. Rows of that day that already
+    landed in the default partition are moved into it before it is attached,
+    since Postgres refuses a partition whose range the default one holds.
+    """
+    name = f"app_metricsample_p{day:%Y%m%d}"
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0]:
+        return
+    start, end = f"'{day}'", f"'{day + timedelta(days=1)}'"
+    cursor.execute(f"CREATE TABLE {name} (LIKE app_metricsample INCLUDING DEFAULTS)")
+    # Hold back concurrent COPYs until the partition is attached.
+    cursor.execute("LOCK TABLE app_metricsample_default IN EXCLUSIVE MODE")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM app_metricsample_default WHERE ts >= {start} AND ts < {end} RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    )
+    moved = cursor.rowcount
+    cursor.execute(f"ALTER TABLE app_metricsample ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})")
+    logger.info(f"Metric partition {name} is created, {moved} samples moved from the default partition")
+
+
+def ensure_partitions(days_ahead: int, retention_days: int) -> None:
+    """
+    Create the daily sample partitions of today and the coming days and drop
+    the ones older than the raw retention, along with expired default rows. Future days go first and each day
+    is created in its own savepoint, so one failing day blocks no other.
+    """
+    today = datetime.now(timezone.utc).date()
+    with connection.cursor() as cursor:
+        for offset in reversed(range(days_ahead + 1)):
+            day = today + timedelta(days=offset)
+            try:
+                with transaction.atomic():
+                    create_partition(cursor, day)
+            except Exception as error:
+                logger.error(f"Metric partition of {day} is not created - {error}")
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = 'app_metricsample' AND child.relname LIKE 'app_metricsample_p%'"
+        )
+        cutoff = f"app_metricsample_p{today - timedelta(days=retention_days):%Y%m%d}"
+        for (name,) in cursor.fetchall():
+            if name < cutoff:
+                cursor.execute(f"DROP TABLE {name}")
+                logger.info(f"Metric partition {name} is dropped")
+        cursor.execute("DELETE FROM app_metricsample_default WHERE ts < %s",
+                       [today - timedelta(days=retention_days)])
+
+
+def rollup(resolution: str, now: datetime = None) -> int:
+    """
+    Recompute the recent buckets of one resolution from the finer data and
+    upsert them, skipping the raw samples left by deleted servers. Returns
+    the number of buckets written.
+    """
+    table, column, aggregates, source, unit, lookback = ROLLUPS[resolution]
+    now = now or datetime.now(timezone.utc)
+    end = now.replace(second=0, microsecond=0)
+    if unit in ("hour", "day"):
+        end = end.replace(minute=0)
+    if unit == "day":
+        end = end.replace(hour=0)
+    start = end - lookback
+    source_filter = "AND resolution = %s" if source else ""
+    params = [resolution, start, end] + ([source] if source else [])
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO app_metricrollup (server_id, metric, resolution, bucket, count, sum, min, max) "
+            f"SELECT server_id, metric, %s, date_trunc('{unit}', {column}), {aggregates} "
+            f"FROM {table} WHERE {column} >= %s AND {column} < %s {source_filter} "
+            f"AND server_id IN (SELECT id FROM app_server) "
+            f"GROUP BY server_id, metric, date_trunc('{unit}', {column}) "
+            f"ON CONFLICT (server_id, metric, resolution, bucket) DO UPDATE SET "
+            f"count = EXCLUDED.count, sum = EXCLUDED.sum, min = EXCLUDED.min, max = EXCLUDED.max",
+            params,
+        )
+        return cursor.rowcount
+
+
+def expire_rollups(retention_days, batch_size: int = 10000) -> int:
+    """
+    Delete the rollup buckets older than the retention of their resolution,
+    given in days per resolution, in batches so no single statement holds
+    locks on millions of rows. Returns the number of rows deleted.
+    """
+    now = datetime.now(timezone.utc)
+    deleted = 0
+    with connection.cursor() as cursor:
+        for resolution, days in retention_days.items():
+            while True:
+                cursor.execute(
+                    "DELETE FROM app_metricrollup WHERE id IN (SELECT id FROM app_metricrollup "
+                    "WHERE resolution = %s AND bucket < %s LIMIT %s)",
+                    [resolution, now - timedelta(days=days), batch_size],
+                )
+                deleted += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    break
+    return deleted
+
+
+def series(server_id, metric: str, resolution: str, start: datetime, end: datetime):
+    """
+    Read the [bucket, avg, min, max] rows of a metric rollup within a range.
+    """
+    from app.models import MetricRollup
+
+    rows = MetricRollup.objects.filter(
+        server_id=server_id, metric=metric, resolution=resolution, bucket__gte=start, bucket__lte=end,
+    ).order_by("bucket").values_list("bucket", "count", "sum", "min", "max")
+    return [[bucket, total / count if count else 0.0, minimum, maximum]
+            for bucket, count, total, minimum, maximum in rows]